@@ -0,0 +1,9 @@
+#!/bin/sh
+# Vercel static build: collect hashed, compressed static files into the CDN output
+# directory (staticfiles_build), then fail the deploy if a stylesheet the pages link is missing.
+set -e
+export STATIC_ROOT="$(pwd)/staticfiles_build/static"
+python3.9 -m pip install -r requirements.txt
+cd flora
+python3.9 manage.py collectstatic --noinput --clear
+python3.9 manage.py check --deploy --tag staticfiles --fail-level ERROR
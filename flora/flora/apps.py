@@ -0,0 +1,11 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    """django.contrib.staticfiles, minus the Bootstrap builds no template loads."""
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + [
+        '*.rtl.*', '*.esm.*', 'bootstrap-grid.*', 'bootstrap-reboot.*', 'bootstrap-utilities.*',
+        'bootstrap.css', 'bootstrap.css.map', 'bootstrap.min.css', 'bootstrap.min.css.map',
+        'bootstrap.js', 'bootstrap.js.map', 'bootstrap.min.js', 'bootstrap.min.js.map',
+        'bootstrap.bundle.js', 'bootstrap.bundle.js.map',
+    ]
@@ -0,0 +1,22 @@
+"""
+Settings for ``manage.py test``, which picks them when DJANGO_SETTINGS_MODULE is
+unset. An exported module or ``--settings`` takes precedence, as for any command.
+
+The suite runs in one process against a throwaway database, so the per-process
+cache is exactly right: nothing outlives the run or leaks between runs. Only
+flagged requests are logged, so the output isn't one line per test request.
+"""
+import os
+
+os.environ.setdefault('REQUEST_LOG_LEVEL', 'WARNING')
+
+from .settings import *  # noqa: E402,F401,F403
+
+CACHES = {'default': {'BACKEND': 'project.instrumentation.LocMemCache', 'LOCATION': 'flora-tests'}}
+SILENCED_SYSTEM_CHECKS = ['project.E001']
+
+# A file rather than shared-cache memory, so threaded tests see SQLite's real
+# WAL behaviour (readers see the last commit) instead of table locks
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':  # noqa: F405
+    (BASE_DIR / '.cache').mkdir(exist_ok=True)  # noqa: F405
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / '.cache' / 'test-db.sqlite3')}  # noqa: F405
@@ -1,20 +1,41 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, Http404
+from django.views.decorators.http import condition, require_http_methods, require_POST
 from django.contrib.auth import login as auth_login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
 from project.models import Product,Cart,Order,Contact,Category,ProductImage
+from project.catalog import product_listing, paginate, paginate_ranked, parse_cursor, product_bundle
+from project import images, suggest
+from project import cart as cart_service
+from project.cart import CartError, load_cart
+from project.caching import cache_anonymous_page, detail_version, detail_etag, detail_last_modified, revalidate
+from project.checkout import place_order, checkout_cart, CheckoutError
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 import hashlib
-from django.db.models import OuterRef, Subquery, Value, CharField, Case, When
-from django.db.models.functions import Concat
-from django.views.decorators.cache import cache_page
+import json
+import logging
+import uuid
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.conf import settings
+from django.core import signing
+from django.middleware.csrf import get_token
 from django.utils.timezone import now
 from django.contrib import messages
 
 # myapp/views.py
 
+logger = logging.getLogger(__name__)
+
+
+def _login_and_merge_cart(request, user):
+    # What the visitor put in their cookie cart moves into the saved cart
+    auth_login(request, user)
+    cart_service.merge_cookie_cart(user, cart_service.read_cookie(request))
+    response = redirect('/')
+    cart_service.write_cookie(response, {})
+    return response
 
 
 def signup_view(request):
@@ -39,8 +60,7 @@ def signup_view(request):
             # Authenticate and log in the user
             user = authenticate(username=username, password=password1)
             if user is not None:
-                auth_login(request, user)
-                return redirect('/')
+                return _login_and_merge_cart(request, user)
 
     return render(request, 'signup.html')
 
@@ -50,9 +70,7 @@ def user_login_view(request):
     if request.method == 'POST':
         form = AuthenticationForm(data=request.POST)
         if form.is_valid():
-            user = form.get_user()
-            auth_login(request, user)  # Correct usage of the login function
-            return redirect('/')
+            return _login_and_merge_cart(request, form.get_user())
     else:
          form = AuthenticationForm()
     return render(request, 'login.html', {'form': form})
@@ -65,49 +83,40 @@ def logout_view(request):
     return redirect('/')
 
 
+@cache_anonymous_page(params=('searchbox', 'after', 'before'))
 def home(request):
-    CLOUDINARY_BASE_URL = "https://res.cloudinary.com/dftwpyllt/"
+    products = product_listing()
 
-    # Annotate with raw image path and image_url from ProductImage
-    image_path_subquery = ProductImage.objects.filter(product=OuterRef('pk')).values('image')[:1]
-    image_url_subquery = ProductImage.objects.filter(product=OuterRef('pk')).values('image_url')[:1]
-
-    # Annotate first with raw image_path (can be None)
-    products = Product.objects.annotate(
-        image_path=Subquery(image_path_subquery, output_field=CharField()),
-        image_url=Subquery(image_url_subquery, output_field=CharField())
-    )
-
-    # Annotate product_image using Case: if image_path exists, prefix with base url, else use image_url
-    products = products.annotate(
-        product_image=Case(
-            When(image_path__isnull=False, then=Concat(Value(CLOUDINARY_BASE_URL), 'image_path')),
-            default='image_url',
-            output_field=CharField()
-        )
-    )
+    after, before = parse_cursor(request.GET.get('after')), parse_cursor(request.GET.get('before'))
 
     # Handle search functionality
-    if request.method == 'GET':
-        search_query = request.GET.get('searchbox')
-        if search_query:
-            products = products.filter(product_name__icontains=search_query)
-            print('product found actually')
-            print(products)
-    return render(request, 'home.html', {"product": products})
-
+    search_query = request.GET.get('searchbox')
+    if search_query:
+        logger.debug("Searching products for %r", search_query)
+        page = paginate_ranked(products, search_query, after=after, before=before)
+    else:
+        page = paginate(products, after=after, before=before)
+    return render(request, 'home.html', {"product": page, "search_query": search_query or ''})
 
-def filter_products(request,slug):
 
+@cache_anonymous_page(params=('after', 'before'))
+def filter_products(request, slug):
+    categories = get_object_or_404(Category, category_slug=slug)
+    page = paginate(
+        product_listing().filter(category=categories),
+        after=parse_cursor(request.GET.get('after')),
+        before=parse_cursor(request.GET.get('before')),
+    )
+    return render(request, 'home.html', {"product": page, "categories": categories})
 
-    categories = Category.objects.get(category_slug=slug)
-    product = Product.objects.filter(category=categories)
-    return render(request, 'home.html', {"product": product, "categories": categories})
-  
 
+@revalidate
+@condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
+@cache_anonymous_page(detail_version)
 def product_detail(request,slug):
-    product=Product.objects.get(product_slug=slug)
-    print(product)
+    product = product_bundle(slug)
+    if product is None:
+        raise Http404("No product matches the given slug.")
 
     data={
         "product":product,
@@ -120,56 +129,158 @@ def product_detail(request,slug):
 
 def search_suggestions(request):
     query = request.GET.get("q", "")
-    print('got query')
-    if query:
-        products = Product.objects.filter(product_name__icontains=query)[:5]  # Use 'product_name' instead of 'name'
-        suggestions = [{"name": product.product_name, "slug": product.product_slug} for product in products]
-        return JsonResponse(suggestions, safe=False)
-    print('searched')
-    return JsonResponse([], safe=False)
+    suggestions = suggest.index.lookup(query, limit=5) if query else []
+    response = JsonResponse(suggestions, safe=False)
+    # Same query, same answer: let the browser and any CDN reuse it briefly
+    patch_cache_control(response, public=True, max_age=settings.SUGGEST_CACHE_SECONDS)
+    return response
+
+
+def thumbnail(request, width, token):
+    if width not in images.WIDTHS:
+        raise Http404("Unsupported width.")
+    try:
+        source = images.source_for(token)
+    except signing.BadSignature:
+        raise Http404("Unknown image.")
+    # AVIF only exists once the background job has run; WebP can be made on the spot
+    avif = images.thumbnail_path(source, width, 'avif')
+    if 'image/avif' in request.headers.get('Accept', '') and avif.exists():
+        path, content_type = avif, 'image/avif'
+    else:
+        try:
+            path, content_type = images.thumbnail(source, width), 'image/webp'
+        except (OSError, ValueError):
+            # Unreachable or not an image: let the browser try the original
+            return redirect(source)
+    response = FileResponse(path.open('rb'), content_type=content_type)
+    # The token pins the source URL, so a given thumbnail URL never changes
+    patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
 
 
-@login_required
 def cart(request):
-
     if request.user.is_authenticated:
-        # Filter cart items for the authenticated user
-        productitem = Cart.objects.filter(user=request.user) 
-        print(productitem.all) # Fetch only user's cart items
+        productitem, cart_total = load_cart(request.user)
     else:
-        productitem = []  # No cart items if not authenticated
-    
-    return render(request, 'cart.html', {'productitem': productitem})
+        productitem, cart_total = cart_service.load_cookie_cart(cart_service.read_cookie(request))
+        get_token(request)  # the page's scripts POST to the cart API
+    return render(request, 'cart.html', {
+        'productitem': productitem,
+        'cart_total': cart_total,
+        'idempotency_key': uuid.uuid4().hex,
+    })
 
 
 
 @login_required
-def cart_add(request):
-    # Support both GET and POST methods
-    if request.method == 'GET':
-        product_slug = request.GET.get('product_slug')
+def cart_checkout(request):
+    if request.method != 'POST':
+        return redirect('cart')
+
+    phoneno1 = request.POST.get('phoneno1')
+    phoneno2 = request.POST.get('phoneno2')
+    address = request.POST.get('address')
+
+    if not phoneno1 or not address:
+        messages.error(request, "Please fill in all required fields.")
+        return redirect('cart')
+
+    try:
+        order, created = checkout_cart(
+            request.user,
+            phoneno1=phoneno1,
+            phoneno2=phoneno2,
+            address=address,
+            idempotency_key=request.POST.get('idempotency_key'),
+            voucher_code=request.POST.get('voucher_code', '').strip(),
+        )
+        messages.success(request, f"Your order #{order.pk} has been placed successfully!")
+    except CheckoutError as e:
+        messages.error(request, str(e))
+    return redirect('cart')
 
-    elif request.method == 'POST':
-        try:
-            import json
-            data = json.loads(request.body)
-            product_slug = data.get('product_slug')
-        except (json.JSONDecodeError, AttributeError, TypeError):
-            return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
 
-    else:
-        return JsonResponse({'success': False, 'error': 'Unsupported method'}, status=405)
+@require_POST
+def cart_add(request):
+    try:
+        data = json.loads(request.body)
+        product_slug = data.get('product_slug')
+    except (json.JSONDecodeError, AttributeError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
 
     if not product_slug:
         return JsonResponse({'success': False, 'error': 'Missing product_slug'}, status=400)
 
     product = get_object_or_404(Product, product_slug=product_slug)
+    if request.user.is_authenticated:
+        created = cart_service.add(request.user, product.pk)
+        return JsonResponse({'success': True, 'created': created})
+
+    items = cart_service.read_cookie(request)
+    created = product.pk not in items
+    try:
+        items = cart_service.apply_cookie_changes(items, [{'product_slug': product_slug}])
+    except CartError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    response = JsonResponse({'success': True, 'created': created})
+    cart_service.write_cookie(response, items)
+    return response
+
+
+def cart_json(lines, total):
+    return {
+        'lines': [
+            {
+                'product_slug': line.product.product_slug,
+                'name': line.product.product_name,
+                'quantity': line.quantity,
+                'unit_price': f'{line.product.effective_price:.2f}',
+                'line_total': f'{line.line_total:.2f}',
+            }
+            for line in lines
+        ],
+        'count': sum(line.quantity for line in lines),
+        'total': f'{total:.2f}',
+    }
+
 
-    cart, created = Cart.objects.get_or_create(user=request.user, product=product)
+@require_http_methods(['GET', 'POST', 'PATCH', 'DELETE'])
+def cart_api(request):
+    """
+    GET lists the cart. POST adds, PATCH sets and DELETE removes, either one
+    line ({"product_slug": ..., "quantity": n}) or several at once
+    ({"lines": [...]}, each line may name its own "op"). Every response is the
+    updated cart. Anonymous visitors' carts live in a signed cookie.
+    """
+    anonymous = not request.user.is_authenticated
+    items = cart_service.read_cookie(request) if anonymous else None
+    if request.method != 'GET':
+        try:
+            data = json.loads(request.body)
+            changes = data['lines'] if 'lines' in data else [data]
+            default_op = {'POST': 'add', 'PATCH': 'set', 'DELETE': 'remove'}[request.method]
+            changes = [{'op': default_op, **change} for change in changes]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return JsonResponse({'error': 'Expected a JSON object or {"lines": [...]}'}, status=400)
+        try:
+            if anonymous:
+                items = cart_service.apply_cookie_changes(items, changes)
+            else:
+                cart_service.apply_changes(request.user, changes)
+        except CartError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
 
-    return JsonResponse({'success': True, 'created': created})  
+    if not anonymous:
+        return JsonResponse(cart_json(*load_cart(request.user)))
+    response = JsonResponse(cart_json(*cart_service.load_cookie_cart(items)))
+    if request.method != 'GET':
+        cart_service.write_cookie(response, items)
+    return response
 
 
+@login_required
 def order(request, slug):
     product = get_object_or_404(Product, product_slug=slug)
 
@@ -183,24 +294,27 @@ def order(request, slug):
             messages.error(request, "Please fill in all required fields.")
         else:
             try:
-                total_price = int(quantity) * int(product.product_price)
-                order = Order(
-                    user=request.user,
-                    product=product,
-                    quantity=quantity,
+                place_order(
+                    request.user,
+                    product,
+                    int(quantity),
                     phoneno1=phoneno1,
                     phoneno2=phoneno2,
                     address=address,
-                    total_price=total_price
+                    idempotency_key=request.POST.get('idempotency_key'),
+                    voucher_code=request.POST.get('voucher_code', '').strip(),
                 )
-                order.save()
                 messages.success(request, "Your order has been placed successfully!")
+            except ValueError:
+                messages.error(request, "Please enter a valid quantity.")
+            except CheckoutError as e:
+                messages.error(request, str(e))
             except Exception as e:
                 messages.error(request, "Something went wrong while placing your order.")
 
         return redirect(request.path)  # reloads page to show message
 
-    return render(request, 'order.html', {'product': product})
+    return render(request, 'order.html', {'product': product, 'idempotency_key': uuid.uuid4().hex})
 
 
 def contact(request):
@@ -218,6 +332,7 @@ def contact(request):
 
 
     return render(request, "contact.html")
+@cache_anonymous_page()
 def about(request):
     return render(request,'about.html')
 
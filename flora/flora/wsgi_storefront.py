@@ -0,0 +1,18 @@
+"""
+WSGI entry point for the shop pages only.
+
+Runs with FLORA_STOREFRONT_ONLY, so the admin, its theme and editor apps are
+never loaded and serverless cold starts import less. vercel.json sends
+/admin/ to flora/wsgi.py instead.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flora.settings')
+os.environ.setdefault('FLORA_STOREFRONT_ONLY', 'True')
+
+application = get_wsgi_application()
+
+app = application
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flora.settings')
+    if 'DJANGO_SETTINGS_MODULE' not in os.environ:
+        # An exported module (or --settings) always wins; only the bare default differs for tests
+        os.environ['DJANGO_SETTINGS_MODULE'] = 'flora.test_settings' if sys.argv[1:2] == ['test'] else 'flora.settings'
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -1,9 +1,9 @@
 from django.contrib import admin
-from .models import Product, Analytics, ProductImage, Cart, Order, Contact, Category, Discount, Voucher
+from .models import Product, Analytics, ProductImage, Cart, Order, OrderLine, Contact, Category, Discount, Voucher, VoucherRedemption, DailySales, StatusCount, Job
 from django.utils.html import format_html
 from django import forms
 from django.shortcuts import render
-from django.urls import path
+from django.urls import path, reverse
 from django.db.models import Sum, Count
 from django.utils.timezone import now
 import datetime
@@ -12,7 +12,14 @@ from django.utils.safestring import mark_safe
 from django.contrib.auth.models import User
 from django.template.response import TemplateResponse
 from django.contrib.admin import AdminSite
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.contrib import messages
+from django.shortcuts import redirect
+from . import exporter, jobs
+from .importer import format_for, save_upload
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
 
 # -----------------------------
@@ -43,6 +50,150 @@ class ProductImageAdminForm(forms.ModelForm):
             raise forms.ValidationError("You must provide either an uploaded image or an image URL.")
         return cleaned_data
 
+# -----------------------------
+# Changelist helpers for big tables
+# -----------------------------
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Foreign-key filter that searches the related admin's autocomplete view
+    instead of rendering every user or product as a choice. Only the
+    selected object is loaded. The related admin needs ``search_fields``.
+    """
+    template = 'admin/autocomplete_filter.html'
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        return field.get_choices(include_blank=False, limit_choices_to={'pk__in': self.lookup_val})
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        selected = {str(value) for value in self.lookup_val or ()}
+        for pk, label in self.lookup_choices:
+            yield {'value': pk, 'display': label, 'selected': str(pk) in selected}
+
+    @property
+    def autocomplete_params(self):
+        opts = self.field.model._meta
+        return {'app_label': opts.app_label, 'model_name': opts.model_name, 'field_name': self.field.name}
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, an unfiltered changelist over a big table takes its row
+    count from the planner statistics instead of running COUNT(*). Filtered
+    lists and small tables still count exactly.
+    """
+    exact_below = 10_000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if connection.vendor == 'postgresql' and query is not None and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                    [self.object_list.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.exact_below:
+                return row[0]
+        return super().count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+
+
+class StockFilter(admin.SimpleListFilter):
+    title = 'stock'
+    parameter_name = 'stock'
+    LOW_STOCK = 5
+
+    def lookups(self, request, model_admin):
+        return [('out', 'Out of stock'), ('low', f'Under {self.LOW_STOCK}'), ('in', 'In stock')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'out':
+            return queryset.filter(stock=0)
+        if self.value() == 'low':
+            return queryset.filter(stock__gt=0, stock__lt=self.LOW_STOCK)
+        if self.value() == 'in':
+            return queryset.filter(stock__gt=0)
+        return queryset
+
+# -----------------------------
+# Bulk product import
+# -----------------------------
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or JSON Lines; see project/importer.py for the columns.")
+    format = forms.ChoiceField(choices=[('', 'From the file name'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')], required=False)
+
+# -----------------------------
+# Streaming exports
+# -----------------------------
+EXPORT_FORMATS = [('csv', 'CSV'), ('jsonl', 'JSON Lines')]
+
+
+class ExportForm(forms.Form):
+    format = forms.ChoiceField(choices=EXPORT_FORMATS)
+
+    def filter(self, queryset):
+        return queryset
+
+
+class OrderExportForm(ExportForm):
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    status = forms.ChoiceField(choices=[('', 'Any')] + Order._meta.get_field('status').choices, required=False)
+
+    def filter(self, queryset):
+        data = self.cleaned_data
+        return exporter.filter_orders(queryset, data['date_from'], data['date_to'], data['status'])
+
+
+class ExportAdminMixin:
+    """An export page (``<changelist>/export/``) and actions that stream rows as CSV or JSON Lines."""
+    export_columns = ()
+    export_ordering = ('pk',)
+    export_form = ExportForm
+    actions = ['export_csv', 'export_jsonl']
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        urls = [path('export/', self.admin_site.admin_view(self.export_view), name='%s_%s_export' % info)]
+        return urls + super().get_urls()
+
+    def export(self, queryset, fmt):
+        return exporter.export_response(
+            queryset, self.export_columns, fmt, self.model._meta.verbose_name_plural, self.export_ordering,
+        )
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        form = self.export_form(request.GET or None)
+        if form.is_bound and form.is_valid():
+            return self.export(form.filter(self.get_queryset(request)), form.cleaned_data['format'])
+        return TemplateResponse(request, 'admin/export.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': f'Export {self.model._meta.verbose_name_plural}',
+        })
+
+    @admin.action(description="Export selected as CSV", permissions=['view'])
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv')
+
+    @admin.action(description="Export selected as JSON Lines", permissions=['view'])
+    def export_jsonl(self, request, queryset):
+        return self.export(queryset, 'jsonl')
+
 # -----------------------------
 # Category Admin
 # -----------------------------
@@ -60,13 +211,40 @@ class ProductImageInline(admin.TabularInline):
 # -----------------------------
 # Product Admin
 # -----------------------------
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ScalableAdmin):
     form = ProductAdminForm
-    list_display = ('product_name', 'category', 'product_price', 'stock', 'hot_sale')
-    list_filter = ('category', 'hot_sale', 'stock')
+    list_display = ('product_name', 'category', 'product_price', 'effective_price', 'stock', 'hot_sale')
+    list_filter = ('category', 'hot_sale', StockFilter)
+    list_select_related = ('category',)
     search_fields = ('product_name', 'category__name')
     inlines = [ProductImageInline]
     list_editable = ('stock', 'hot_sale')
+    change_list_template = 'admin/project/product/change_list.html'
+
+    def get_urls(self):
+        urls = [path('import/', self.admin_site.admin_view(self.import_view), name='project_product_import')]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or format_for(upload.name)
+            # Large catalogs take longer than a request may; run_jobs imports the saved copy
+            jobs.enqueue('project.importer.import_file', path=str(save_upload(upload)), fmt=fmt)
+            self.message_user(request, format_html(
+                'Import of {} queued. Its report will be on the <a href="{}?task=project.importer.import_file">jobs page</a>.',
+                upload.name, reverse('admin:project_job_changelist'),
+            ), messages.SUCCESS)
+            return redirect('admin:project_product_changelist')
+        return TemplateResponse(request, 'admin/project/product/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Import products',
+        })
 
     def product_image_preview(self, obj):
         if obj.product_image:
@@ -77,10 +255,14 @@ class ProductAdmin(admin.ModelAdmin):
 # -----------------------------
 # ProductImage Admin
 # -----------------------------
-class ProductImageAdmin(admin.ModelAdmin):
+class ProductImageAdmin(ScalableAdmin):
     form = ProductImageAdminForm
-    list_display = ['product', 'preview_image_or_url']
+    list_display = ['product', 'preview_image_or_url', 'width', 'height', 'processed_at']
+    list_filter = [('product', AutocompleteFilter)]
+    list_select_related = ['product']
     search_fields = ['product__product_name']
+    autocomplete_fields = ['product']
+    date_hierarchy = 'processed_at'
 
     def preview_image_or_url(self, obj):
         if obj.image:
@@ -90,27 +272,62 @@ class ProductImageAdmin(admin.ModelAdmin):
         return "No image"
     preview_image_or_url.short_description = "Preview"
 
+# -----------------------------
+# Background jobs
+# -----------------------------
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'payload', 'status', 'attempts', 'run_after', 'created_at', 'summary')
+    list_filter = ('status', 'task')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'result', 'created_at')
+    actions = ['retry']
+
+    @admin.display(description="Result")
+    def summary(self, obj):
+        return obj.result.partition('\n')[0]
+
+    @admin.action(description="Retry selected jobs now")
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(status=Job.PENDING, run_after=now(), attempts=0)
+        self.message_user(request, f"{updated} job(s) queued again.")
+
 # -----------------------------
 # Discount Admin
 # -----------------------------
 class DiscountAdmin(admin.ModelAdmin):
     list_display = ('product', 'discount_type', 'discount_value', 'start_date', 'end_date')
     list_filter = ('discount_type', 'start_date', 'end_date')
+    list_select_related = ('product',)
     search_fields = ('product__product_name',)
+    autocomplete_fields = ('product',)
+
+# -----------------------------
+# Voucher Redemption Inline for Voucher
+# -----------------------------
+class VoucherRedemptionInline(admin.TabularInline):
+    model = VoucherRedemption
+    extra = 0
+    can_delete = False
+    readonly_fields = ('user', 'order', 'redeemed_at')
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 # -----------------------------
 # Voucher Admin
 # -----------------------------
 class VoucherAdmin(admin.ModelAdmin):
-    list_display = ('code', 'discount_type', 'discount_value', 'valid_from', 'valid_to', 'usage_limit')
+    list_display = ('code', 'discount_type', 'discount_value', 'valid_from', 'valid_to', 'usage_limit', 'times_used')
     list_filter = ('discount_type', 'valid_from', 'valid_to')
     search_fields = ('code',)
+    inlines = [VoucherRedemptionInline]
 
 # -----------------------------
 # Cart Admin
 # -----------------------------
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(ScalableAdmin):
     list_display = ('user', 'product', 'quantity')
+    list_filter = (('user', AutocompleteFilter), ('product', AutocompleteFilter))
+    list_select_related = ('user', 'product')
     search_fields = ('user__username', 'product__product_name')
 
     def get_readonly_fields(self, request, obj=None):
@@ -122,14 +339,32 @@ class CartAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         return False
 
+# -----------------------------
+# Order Line Inline for Order
+# -----------------------------
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    can_delete = False
+    readonly_fields = ('product', 'quantity', 'unit_price', 'line_total')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 # -----------------------------
 # Order Admin
 # -----------------------------
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportAdminMixin, ScalableAdmin):
+    export_columns = exporter.ORDER_COLUMNS
+    export_ordering = exporter.ORDER_ORDERING
+    export_form = OrderExportForm
     list_display = ('user', 'product','quantity', 'order_date', 'total_price', 'status')
-    list_filter = ('status', 'order_date', 'user', 'product')
+    list_filter = ('status', ('user', AutocompleteFilter), ('product', AutocompleteFilter))
+    list_select_related = ('user', 'product')
+    date_hierarchy = 'order_date'
     search_fields = ('user__username', 'product__product_name')
     list_editable = ('status',)
+    inlines = [OrderLineInline]
     def get_readonly_fields(self, request, obj=None):
         return [field.name for field in self.model._meta.fields]
 
@@ -142,7 +377,8 @@ class OrderAdmin(admin.ModelAdmin):
 # -----------------------------
 # Contact Admin
 # -----------------------------
-class ContactAdmin(admin.ModelAdmin):
+class ContactAdmin(ExportAdminMixin, admin.ModelAdmin):
+    export_columns = exporter.CONTACT_COLUMNS
     list_display = ('name', 'email', 'message')
     search_fields = ('name', 'email')
 
@@ -157,32 +393,40 @@ class ContactAdmin(admin.ModelAdmin):
 
 # -----------------------------
 # Analytics Admin with Dashboard
-# # -----------------------------
-# class AnalyticsAdmin(admin.ModelAdmin):
-#     change_list_template = "admin/analytics_dashboard.html"
+# -----------------------------
+class AnalyticsAdmin(admin.ModelAdmin):
+    change_list_template = "admin/analytics_dashboard.html"
+    list_display = ('total_sales', 'total_orders', 'total_users', 'last_updated')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
-#     def changelist_view(self, request, extra_context=None):
-#         orders_per_status = Order.objects.values("status").annotate(count=Count("id"))
-#         sales_data = Order.objects.values("order_date").annotate(total_sales=Sum("total_price"))
+    def changelist_view(self, request, extra_context=None):
+        # Read the incrementally maintained rollups (see project.analytics), never the orders table
+        orders_per_status = StatusCount.objects.filter(order_count__gt=0).order_by('status')
+        sales_data = DailySales.objects.order_by('day')
 
-#         status_labels = [entry["status"] for entry in orders_per_status]
-#         status_values = [entry["count"] for entry in orders_per_status]
+        status_labels = [entry.status for entry in orders_per_status]
+        status_values = [entry.order_count for entry in orders_per_status]
 
-#         sales_labels = [entry["order_date"].strftime("%Y-%m-%d") for entry in sales_data]
-#         sales_values = [entry["total_sales"] for entry in sales_data]
+        sales_labels = [entry.day.strftime("%Y-%m-%d") for entry in sales_data]
+        sales_values = [float(entry.total_sales) for entry in sales_data]
 
-#         extra_context = extra_context or {}
-#         extra_context["status_labels"] = json.dumps(status_labels)
-#         extra_context["status_values"] = json.dumps(status_values)
-#         extra_context["sales_labels"] = json.dumps(sales_labels)
-#         extra_context["sales_values"] = json.dumps(sales_values)
+        extra_context = extra_context or {}
+        extra_context["status_labels"] = json.dumps(status_labels)
+        extra_context["status_values"] = json.dumps(status_values)
+        extra_context["sales_labels"] = json.dumps(sales_labels)
+        extra_context["sales_values"] = json.dumps(sales_values)
 
-#         return super().changelist_view(request, extra_context=extra_context)
+        return super().changelist_view(request, extra_context=extra_context)
 
-# # -----------------------------
-# # Admin Registration
-# # -----------------------------
-# admin.site.register(Analytics, AnalyticsAdmin)
+# -----------------------------
+# Admin Registration
+# -----------------------------
+admin.site.register(Analytics, AnalyticsAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(ProductImage, ProductImageAdmin)
 admin.site.register(Category, CategoryAdmin)
@@ -191,6 +435,7 @@ admin.site.register(Order, OrderAdmin)
 admin.site.register(Contact, ContactAdmin)
 admin.site.register(Discount, DiscountAdmin)
 admin.site.register(Voucher, VoucherAdmin)
+admin.site.register(Job, JobAdmin)
 
 
 # Unregister User and Group so they don't show up at all
@@ -0,0 +1,141 @@
+"""
+Sales analytics rollups.
+
+Order and OrderLine changes are folded into per-day, per-status and
+per-product rows (plus the Analytics totals) with F() increments, so the
+admin dashboard reads O(days) rows instead of aggregating the orders table.
+``manage.py backfill_analytics`` rebuilds everything from scratch, as the
+0016 migration did once for the data that predates the rollups.
+
+Order create/status/delete events arrive through project.signals. Lines are
+bulk-inserted at checkout (no signals), so checkout calls ``record_lines``
+itself; line deletions come back through OrderLine's post_delete signal.
+"""
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, PositiveIntegerField, Sum, When
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import Analytics, DailySales, Order, OrderLine, ProductSales, StatusCount
+
+ANALYTICS_PK = 1
+
+
+def _bump(model, lookup, **deltas):
+    """
+    Add ``deltas`` to the row matching ``lookup``, creating it if needed.
+    Positive-only counters stop at zero rather than failing their CHECK
+    constraint, so deleting something the rollup never counted is harmless.
+    """
+    updates = {}
+    for field, delta in deltas.items():
+        if delta < 0 and isinstance(model._meta.get_field(field), PositiveIntegerField):
+            updates[field] = Greatest(F(field) + delta, 0)
+            deltas[field] = 0
+        else:
+            updates[field] = F(field) + delta
+    if model is Analytics:
+        updates['last_updated'] = timezone.now()  # update() skips auto_now
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Someone else created the row first
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _day(order):
+    return timezone.localdate(order.order_date) if timezone.is_aware(order.order_date) else order.order_date.date()
+
+
+def record_order(order, sign=1):
+    _bump(DailySales, {'day': _day(order)}, order_count=sign, total_sales=sign * order.total_price)
+    _bump(StatusCount, {'status': order.status}, order_count=sign)
+    _bump(Analytics, {'pk': ANALYTICS_PK}, total_orders=sign, total_sales=sign * order.total_price)
+
+
+def record_status_change(old_status, new_status):
+    if old_status != new_status:
+        _bump(StatusCount, {'status': old_status}, order_count=-1)
+        _bump(StatusCount, {'status': new_status}, order_count=1)
+
+
+def record_lines(lines, sign=1):
+    """Fold order lines into ProductSales in a fixed number of queries, however many products they cover."""
+    per_product = {}
+    for line in lines:
+        units, revenue = per_product.get(line.product_id, (0, 0))
+        per_product[line.product_id] = (units + sign * line.quantity, revenue + sign * line.line_total)
+    if not per_product:
+        return
+
+    existing = set(ProductSales.objects.filter(product_id__in=per_product).values_list('product_id', flat=True))
+    if existing:
+        ProductSales.objects.filter(product_id__in=existing).update(
+            units_sold=Case(
+                *[When(product_id=pid, then=F('units_sold') + per_product[pid][0]) for pid in existing],
+                output_field=IntegerField(),
+            ),
+            revenue=Case(
+                *[When(product_id=pid, then=F('revenue') + per_product[pid][1]) for pid in existing],
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    missing = [pid for pid in per_product if pid not in existing]
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            ProductSales.objects.bulk_create([
+                ProductSales(product_id=pid, units_sold=per_product[pid][0], revenue=per_product[pid][1])
+                for pid in missing
+            ])
+    except IntegrityError:
+        for pid in missing:
+            _bump(ProductSales, {'product_id': pid}, units_sold=per_product[pid][0], revenue=per_product[pid][1])
+
+
+def record_user(sign=1):
+    _bump(Analytics, {'pk': ANALYTICS_PK}, total_users=sign)
+
+
+def rebuild(apps=global_apps):
+    """
+    Recompute every rollup with one GROUP BY per table. Migrations pass their
+    historical ``apps`` so this runs against the schema of that point.
+    """
+    Analytics, DailySales, StatusCount, ProductSales, Order, OrderLine = (
+        apps.get_model('project', name)
+        for name in ('Analytics', 'DailySales', 'StatusCount', 'ProductSales', 'Order', 'OrderLine')
+    )
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        StatusCount.objects.all().delete()
+        ProductSales.objects.all().delete()
+
+        DailySales.objects.bulk_create([
+            DailySales(day=row['day'], order_count=row['n'], total_sales=row['sales'])
+            for row in Order.objects.annotate(day=TruncDate('order_date')).values('day')
+            .annotate(n=Count('pk'), sales=Sum('total_price')).order_by()
+        ], batch_size=1000)
+        StatusCount.objects.bulk_create([
+            StatusCount(status=row['status'], order_count=row['n'])
+            for row in Order.objects.values('status').annotate(n=Count('pk')).order_by()
+        ])
+        ProductSales.objects.bulk_create([
+            ProductSales(product_id=row['product'], units_sold=row['units'], revenue=row['revenue'])
+            for row in OrderLine.objects.values('product')
+            .annotate(units=Sum('quantity'), revenue=Sum('line_total')).order_by()
+        ], batch_size=1000)
+
+        totals = Order.objects.aggregate(n=Count('pk'), sales=Sum('total_price'))
+        Analytics.objects.update_or_create(pk=ANALYTICS_PK, defaults={
+            'total_orders': totals['n'],
+            'total_sales': totals['sales'] or 0,
+            'total_users': User.objects.count(),
+        })
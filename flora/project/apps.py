@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ProjectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project'
+
+    def ready(self):
+        import cloudinary  # already loaded by the models; configured here so settings stay import-free
+        from django.conf import settings
+
+        from . import checks, signals  # noqa: F401
+
+        storage = settings.CLOUDINARY_STORAGE
+        cloudinary.config(
+            cloud_name=storage['CLOUD_NAME'], api_key=storage['API_KEY'], api_secret=storage['API_SECRET'],
+            secure=True,
+        )
@@ -0,0 +1,467 @@
+"""
+Reproducible storefront benchmarks.
+
+``generate`` fills the database with a seeded synthetic shop (categories,
+products, images, discounts, users, carts, and orders with their lines) at one
+of the SCALES, using bulk inserts and then doing once what the per-row signals
+would have done. The same seed always produces the same data.
+
+``run_client`` times every scenario in SCENARIOS in-process through the
+Django test client; ``run_server`` does the same over HTTP against a local
+gunicorn with concurrent keep-alive clients. Both read the query count of
+each request from the Server-Timing header that project.instrumentation adds.
+
+``compare`` checks results against a JSON baseline (``BASELINE_PATH``): a
+scenario regresses when it runs more queries than the baseline, or when its
+p95 latency or throughput moves past the baseline's thresholds.
+"""
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+
+from . import analytics, caching, pricing, search, suggest
+from .catalog import invalidate_category_counts
+from .models import Cart, Category, Discount, Order, OrderLine, Product, ProductImage
+
+BASELINE_PATH = settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 1000
+
+SCALES = {
+    'tiny': {'categories': 4, 'products': 60, 'images_per_product': 2, 'discounted': 0.1,
+             'users': 10, 'cart_lines': 3, 'orders': 100},
+    'small': {'categories': 20, 'products': 2_000, 'images_per_product': 2, 'discounted': 0.1,
+              'users': 200, 'cart_lines': 3, 'orders': 5_000},
+    'medium': {'categories': 50, 'products': 20_000, 'images_per_product': 3, 'discounted': 0.1,
+               'users': 2_000, 'cart_lines': 4, 'orders': 100_000},
+    'large': {'categories': 200, 'products': 200_000, 'images_per_product': 3, 'discounted': 0.1,
+              'users': 20_000, 'cart_lines': 5, 'orders': 1_000_000},
+}
+
+# A scenario's p95 may grow by latency_tolerance (plus latency_slack_ms, so sub-millisecond noise
+# doesn't count) and its throughput may drop by throughput_tolerance; queries may grow by query_slack
+THRESHOLDS = {'latency_tolerance': 0.5, 'latency_slack_ms': 5.0, 'throughput_tolerance': 0.33, 'query_slack': 0}
+
+ADJECTIVES = ('Velvet', 'Golden', 'Herbal', 'Pure', 'Wild', 'Silk', 'Amber', 'Fresh', 'Royal', 'Desert')
+SCENTS = ('Rose', 'Jasmine', 'Lavender', 'Almond', 'Argan', 'Coconut', 'Neem', 'Saffron', 'Olive', 'Amla')
+KINDS = ('Hair Oil', 'Face Serum', 'Body Butter', 'Soap', 'Shampoo', 'Lip Balm', 'Cream', 'Scrub')
+STATUSES = ('Pending', 'Shipped', 'Delivered')
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def generate(scale, seed=1, stdout=None):
+    """
+    Add one seeded synthetic shop of ``scale`` (a dict like SCALES['small']).
+    Several seeds can live side by side; generating the same seed twice is an error.
+    """
+    rng = random.Random(seed)
+    if User.objects.filter(username=f'shopper-{seed}-0').exists():
+        raise ValueError(f"Data for seed {seed} already exists; pick another seed.")
+
+    def report(message):
+        if stdout:
+            stdout.write(message)
+
+    started = time.perf_counter()
+    now = timezone.now()
+    categories = []
+    for i in range(scale['categories']):
+        category, _ = Category.objects.get_or_create(name=f'{KINDS[i % len(KINDS)]} {i // len(KINDS) + 1}')
+        categories.append(category.pk)
+
+    product_ids, prices = [], {}
+    for batch in _batches(range(scale['products'])):
+        products = []
+        for i in batch:
+            name = f'{rng.choice(ADJECTIVES)} {rng.choice(SCENTS)} {rng.choice(KINDS)} {i}'
+            price = Decimal(rng.randrange(200, 5000))
+            product = Product(
+                product_name=name, product_slug=f'{slugify(name)}-s{seed}', product_price=price,
+                effective_price=price, category_id=categories[i % len(categories)],
+                stock=rng.randrange(0, 200), hot_sale=rng.random() < 0.1,
+                meta_description=f'{name}, handmade in small batches.',
+                primary_image_url=f'https://example.com/s{seed}/{i}/0.jpg' if scale['images_per_product'] else '',
+            )
+            product._slug_precomputed = True
+            products.append(product)
+        with transaction.atomic():
+            Product.objects.bulk_create(products)
+            ProductImage.objects.bulk_create([
+                ProductImage(product_id=product.pk, image_url=f'https://example.com/s{seed}/{i}/{n}.jpg')
+                for i, product in zip(batch, products)
+                for n in range(scale['images_per_product'])
+            ], batch_size=BATCH_SIZE)
+            discounted = [product.pk for product in products if rng.random() < scale['discounted']]
+            Discount.objects.bulk_create([
+                Discount(
+                    product_id=pk, discount_type='percentage', discount_value=rng.choice((10, 15, 20, 25)),
+                    start_date=now - timedelta(days=rng.randrange(1, 30)),
+                    end_date=now + timedelta(days=rng.randrange(1, 30)),
+                )
+                for pk in discounted
+            ])
+            # What the post_save handlers do per product, once for the batch
+            pricing.refresh_prices(discounted)
+            search.index_products([product.pk for product in products])
+        product_ids += [product.pk for product in products]
+        prices.update((product.pk, product.product_price) for product in products)
+    report(f"{len(product_ids)} products in {time.perf_counter() - started:.1f}s")
+
+    password = make_password(PASSWORD)  # hashing is deliberately slow; do it once
+    user_ids = []
+    for batch in _batches(range(scale['users'])):
+        users = User.objects.bulk_create([
+            User(username=f'shopper-{seed}-{i}', email=f'shopper-{seed}-{i}@example.com', password=password)
+            for i in batch
+        ])
+        user_ids += [user.pk for user in users]
+        Cart.objects.bulk_create([
+            Cart(user_id=user.pk, product_id=product_id, quantity=rng.randrange(1, 4))
+            for user in users
+            for product_id in rng.sample(product_ids, min(scale['cart_lines'], len(product_ids)))
+        ], batch_size=BATCH_SIZE)
+    report(f"{len(user_ids)} users with carts in {time.perf_counter() - started:.1f}s")
+
+    for batch in _batches(range(scale['orders'])):
+        orders, order_lines = [], []
+        for _ in batch:
+            # Mostly single-product orders, like place_order; the rest are whole-cart checkouts
+            picked = rng.sample(product_ids, min(rng.choice((1, 1, 2, 3)), len(product_ids)))
+            lines = [OrderLine(product_id=product_id, quantity=rng.randrange(1, 4), unit_price=prices[product_id])
+                     for product_id in picked]
+            for line in lines:
+                line.line_total = line.unit_price * line.quantity
+            orders.append(Order(
+                user_id=rng.choice(user_ids), product_id=picked[0] if len(lines) == 1 else None,
+                quantity=sum(line.quantity for line in lines),
+                phoneno1='03000000000', address=f'House {rng.randrange(1, 500)}, Street {rng.randrange(1, 90)}',
+                order_date=now - timedelta(minutes=rng.randrange(0, 365 * 24 * 60)),
+                total_price=sum(line.line_total for line in lines), status=rng.choice(STATUSES),
+            ))
+            order_lines.append(lines)
+        Order.objects.bulk_create(orders)
+        for order, lines in zip(orders, order_lines):
+            for line in lines:
+                line.order_id = order.pk
+        OrderLine.objects.bulk_create([line for lines in order_lines for line in lines], batch_size=BATCH_SIZE)
+    report(f"{scale['orders']} orders in {time.perf_counter() - started:.1f}s")
+
+    analytics.rebuild()
+    invalidate_category_counts()
+    caching.invalidate_catalog()
+    transaction.on_commit(suggest.index.clear)  # rebuilt on the next lookup
+    return product_ids, user_ids
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+class Context:
+    """What the scenarios request: a shopper with a cart, sample products and search terms."""
+
+    def __init__(self, sample=50, cart_lines=20):
+        self.user, _ = User.objects.get_or_create(username='bench-shopper')
+        self.user.set_password(PASSWORD)
+        self.user.save()
+        products = list(Product.objects.order_by('pk').values_list('pk', 'product_slug', 'product_name')[:sample])
+        if not products:
+            raise ValueError("There are no products to benchmark; run manage.py generate_data first.")
+        self.slugs = [slug for _, slug, _ in products]
+        self.terms = list(dict.fromkeys(name.split()[1].lower() for _, _, name in products if ' ' in name)) or ['a']
+        # Orders and cart additions must never run out of stock mid-run
+        Product.objects.filter(pk__in=[pk for pk, _, _ in products]).update(stock=10 ** 9)
+        Cart.objects.filter(user=self.user).delete()
+        Cart.objects.bulk_create([Cart(user=self.user, product_id=pk) for pk, _, _ in products[:cart_lines]])
+
+    def slug(self, i):
+        return self.slugs[i % len(self.slugs)]
+
+    def term(self, i):
+        return self.terms[i % len(self.terms)]
+
+
+class Scenario:
+    def __init__(self, name, path, method='GET', data=None, login=True):
+        self.name = name
+        self.path = path  # (context, i) -> path
+        self.method = method
+        self.data = data  # (context, i) -> (content_type, body)
+        self.login = login
+
+    def request(self, context, i):
+        """``(method, path, content_type, body)`` of the i-th request."""
+        content_type, body = self.data(context, i) if self.data else (None, '')
+        return self.method, self.path(context, i), content_type, body
+
+
+def _order_form(context, i):
+    return 'application/x-www-form-urlencoded', urlencode({
+        'quantity': 1, 'phoneno1': '03000000000', 'address': 'Benchmark House',
+        'idempotency_key': get_random_string(32),
+    })
+
+
+SCENARIOS = [
+    Scenario('home', lambda c, i: reverse('home')),
+    Scenario('home_anonymous', lambda c, i: reverse('home'), login=False),
+    Scenario('home_search', lambda c, i: f"{reverse('home')}?{urlencode({'searchbox': c.term(i)})}"),
+    Scenario('search_suggestions', lambda c, i: f"{reverse('search_suggestions')}?{urlencode({'q': c.term(i)[:3]})}"),
+    Scenario('product_detail', lambda c, i: reverse('product_detail', args=[c.slug(i)])),
+    Scenario('product_detail_anonymous', lambda c, i: reverse('product_detail', args=[c.slug(i)]), login=False),
+    Scenario('cart', lambda c, i: reverse('cart')),
+    Scenario('cart_add', lambda c, i: reverse('cart_add'), 'POST',
+             lambda c, i: ('application/json', json.dumps({'product_slug': c.slug(i)}))),
+    Scenario('order_page', lambda c, i: reverse('order', args=[c.slug(i)])),
+    Scenario('order', lambda c, i: reverse('order', args=[c.slug(i)]), 'POST', _order_form),
+]
+
+
+def select(names=None):
+    if not names:
+        return SCENARIOS
+    unknown = set(names) - {scenario.name for scenario in SCENARIOS}
+    if unknown:
+        raise ValueError(f"Unknown scenario {', '.join(sorted(unknown))}.")
+    return [scenario for scenario in SCENARIOS if scenario.name in names]
+
+
+def queries_from(server_timing):
+    match = SERVER_TIMING_QUERIES.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+def summarize(latencies, queries, errors, elapsed):
+    """The numbers kept for a scenario; latencies in seconds."""
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        'p95_ms': round(p95 * 1000, 2),
+        'queries': int(statistics.median(queries)) if queries else None,
+    }
+
+
+@contextmanager
+def quiet_request_log():
+    # One INFO line per request would swamp the output (and the timings); flagged requests still log
+    logger = logging.getLogger('project.requests')
+    level = logger.level
+    logger.setLevel(max(level, logging.WARNING))
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+# ---------------------------------------------------------------------------
+# In-process: the Django test client
+# ---------------------------------------------------------------------------
+
+@override_settings(SERVER_TIMING=True)
+@quiet_request_log()
+def run_client(scenarios=None, requests=200, warmup=None, context=None):
+    """
+    Run each scenario ``requests`` times in a row, after ``warmup`` untimed requests
+    (by default one pass over the sample products, so caches are warm).
+    """
+    context = context or Context()
+    if warmup is None:
+        warmup = len(context.slugs)
+    results = {}
+    for scenario in select(scenarios):
+        client = Client()
+        if scenario.login:
+            client.force_login(context.user)
+        latencies, queries, errors = [], [], 0
+
+        def send(i):
+            method, path, content_type, body = scenario.request(context, i)
+            if method == 'GET':
+                return client.get(path)
+            return client.generic(method, path, body, content_type)
+
+        for i in range(warmup):
+            send(i)
+        started = time.perf_counter()
+        for i in range(requests):
+            request_started = time.perf_counter()
+            response = send(i)
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 400:
+                errors += 1
+            count = queries_from(response.get('Server-Timing'))
+            if count is not None:
+                queries.append(count)
+        results[scenario.name] = summarize(latencies, queries, errors, time.perf_counter() - started)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Over HTTP: a local gunicorn
+# ---------------------------------------------------------------------------
+
+def _session_cookie(context):
+    client = Client()
+    client.force_login(context.user)
+    return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+def _hammer(port, scenario, context, cookies, concurrency, duration):
+    """Send the scenario's requests from ``concurrency`` keep-alive clients for ``duration`` seconds."""
+    csrf = get_random_string(32)  # a cookie secret doubles as its own unmasked token
+    cookie = '; '.join(f'{name}={value}' for name, value in {**cookies, settings.CSRF_COOKIE_NAME: csrf}.items())
+    stop = time.monotonic() + duration
+
+    def client(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        latencies, queries, errors, i = [], [], 0, offset
+        while time.monotonic() < stop:
+            method, path, content_type, body = scenario.request(context, i)
+            i += concurrency
+            headers = {'Cookie': cookie, 'X-CSRFToken': csrf}
+            if content_type:
+                headers['Content-Type'] = content_type
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body or None, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except OSError:
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status >= 400:
+                errors += 1
+            count = queries_from(response.getheader('Server-Timing'))
+            if count is not None:
+                queries.append(count)
+        conn.close()
+        return latencies, queries, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    return summarize(
+        [l for latencies, _, _ in results for l in latencies],
+        [q for _, queries, _ in results for q in queries],
+        sum(errors for _, _, errors in results),
+        time.perf_counter() - started,
+    )
+
+
+def run_server(scenarios=None, duration=10, warmup=2, concurrency=8, workers=2, threads=4, context=None):
+    """Start gunicorn on the configured database and load each scenario for ``duration`` seconds, after ``warmup``."""
+    from .management.commands.loadtest import free_port, wait_for
+
+    if connection.vendor == 'sqlite':
+        database_url = f"sqlite:///{connection.settings_dict['NAME']}"
+    else:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            raise ValueError("Set DATABASE_URL to the PostgreSQL database to benchmark.")
+    context = context or Context()
+    cookies = {settings.SESSION_COOKIE_NAME: _session_cookie(context)}
+    connection.close()  # let the server have the database to itself
+
+    port = free_port()
+    env = {
+        **os.environ, 'DATABASE_URL': database_url, 'DJANGO_SETTINGS_MODULE': 'flora.settings',
+        'SERVER_TIMING': 'True', 'REQUEST_LOG_LEVEL': 'WARNING',
+    }
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'flora.wsgi_storefront:application',
+         '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+         '--log-level', 'warning'],
+        cwd=settings.BASE_DIR, env=env,
+    )
+    results = {}
+    try:
+        wait_for(port)
+        for scenario in select(scenarios):
+            scenario_cookies = cookies if scenario.login else {}
+            _hammer(port, scenario, context, scenario_cookies, concurrency, warmup)
+            results[scenario.name] = _hammer(port, scenario, context, scenario_cookies, concurrency, duration)
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Baseline
+# ---------------------------------------------------------------------------
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(baseline, path=BASELINE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, thresholds=None):
+    """Human-readable regressions of ``results`` against ``baseline`` (both ``{scenario: numbers}``)."""
+    limits = {**THRESHOLDS, **(thresholds or {})}
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['errors'] > base.get('errors', 0):
+            regressions.append(f"{name}: {current['errors']} errors (baseline {base.get('errors', 0)})")
+        if None not in (current['queries'], base.get('queries')) and current['queries'] > base['queries'] + limits['query_slack']:
+            regressions.append(f"{name}: {current['queries']} queries per request (baseline {base['queries']})")
+        ceiling = base['p95_ms'] * (1 + limits['latency_tolerance']) + limits['latency_slack_ms']
+        if current['p95_ms'] > ceiling:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.1f}ms (baseline {base['p95_ms']:.1f}ms, limit {ceiling:.1f}ms)")
+        floor = base['rps'] * (1 - limits['throughput_tolerance'])
+        if current['rps'] < floor:
+            regressions.append(f"{name}: {current['rps']:.0f} req/s (baseline {base['rps']:.0f}, limit {floor:.0f})")
+    return regressions
@@ -0,0 +1,171 @@
+"""
+Page and fragment caching for the storefront.
+
+Anonymous GETs of catalog pages are served from the cache. A page's key
+carries a version number: listings use one catalog-wide version; a detail
+page uses its product's version. A change bumps the matching version, so
+stale pages are never read again and simply age out. Rendered
+``product_card.html`` fragments are deleted per product. project.signals,
+pricing refreshes, imports and checkout call ``invalidate_products`` once
+their transaction commits; bumping earlier would let a concurrent request
+cache the old row under the new version.
+
+Product versions also drive the detail page's ETag/Last-Modified, so
+revalidating clients get a 304 without the view running at all.
+
+No signal fires when a discount window opens or closes, so cached pages run
+``pricing.refresh_due_prices`` before the lookup; a product it reprices bumps
+the versions like any other change.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.middleware.csrf import get_token
+
+from . import pricing
+from .models import Product
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter can never repeat an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _touch(key):
+    # Product versions are nanosecond timestamps, so they double as Last-Modified
+    cache.set(key, time.time_ns(), None)
+
+
+def catalog_version():
+    return _version(CATALOG_VERSION_KEY)
+
+
+def product_version(slug):
+    """
+    Changes whenever the product's page would; also the time (ns) of that change.
+    Unknown slugs get 0 and no key, so requests for made-up URLs can't fill the cache.
+    """
+    key = f'product:version:{slug}'
+    version = cache.get(key)
+    if version is None:
+        if not Product.objects.filter(product_slug=slug).exists():
+            return 0
+        version = _version(key)
+    return version
+
+
+def card_key(product_id):
+    return make_template_fragment_key('product_card', [product_id])
+
+
+def invalidate_products(products, listings=True):
+    """
+    Drop cached output for ``products`` (objects with ``pk`` and ``product_slug``).
+    Pass ``listings=False`` for changes that cards and listings don't show, such as stock.
+    """
+    products = list(products)
+    if listings:
+        cache.delete_many([card_key(product.pk) for product in products])
+        _bump(CATALOG_VERSION_KEY)
+    for product in products:
+        _touch(f'product:version:{product.product_slug}')
+
+
+def invalidate_catalog():
+    _bump(CATALOG_VERSION_KEY)
+
+
+def listing_version(request, *args, **kwargs):
+    return f'catalog-{catalog_version()}'
+
+
+def detail_version(request, slug, *args, **kwargs):
+    return f'product-{slug}-{product_version(slug)}'
+
+
+def page_key(request, version, params=()):
+    """The path plus only the query parameters in ``params``, in that order; others don't change the page."""
+    query = urlencode([(name, request.GET[name]) for name in params if request.GET.get(name)])
+    return f'page:{version}:{hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()}'
+
+
+def cache_anonymous_page(version=listing_version, params=()):
+    """
+    Serve anonymous GETs from the cache under ``version(request, ...)``.
+    ``params`` names the query parameters the view reads; anything else
+    (tracking tags, junk) shares the plain page's entry instead of adding one.
+    Pages that embed a CSRF token (forms) are never stored, because that
+    token belongs to one visitor. Every visitor still gets a CSRF cookie so
+    scripts can POST.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            pricing.refresh_due_prices()  # throttled; repriced products bump their versions
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = page_key(request, version(request, *args, **kwargs), params)
+            content = cache.get(key)
+            if content is not None:
+                response = HttpResponse(content)
+                response['X-Page-Cache'] = 'hit'
+            else:
+                response = view(request, *args, **kwargs)
+                if (
+                    response.status_code == 200
+                    and not response.streaming
+                    and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                ):
+                    cache.set(key, response.content, settings.PAGE_CACHE_SECONDS)
+                response['X-Page-Cache'] = 'miss'
+            get_token(request)
+            return response
+        return wrapped
+    return decorator
+
+
+def _current_product_version(slug):
+    # The validators are checked before the page cache runs its refresh; a 304 must not confirm an old price
+    pricing.refresh_due_prices()
+    return product_version(slug)
+
+
+def detail_etag(request, slug, *args, **kwargs):
+    # Logged-in and anonymous visitors can see different markup, so they get different tags
+    return f'{slug}-{_current_product_version(slug)}-{int(request.user.is_authenticated)}'
+
+
+def detail_last_modified(request, slug, *args, **kwargs):
+    return datetime.fromtimestamp(_current_product_version(slug) / 1e9, tz=dt_timezone.utc)
+
+
+def revalidate(view):
+    """Ask browsers and CDNs to revalidate every time, which is cheap thanks to the ETag."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, no_cache=True)
+        return response
+    return wrapped
@@ -0,0 +1,200 @@
+"""
+Shopping cart reads and writes.
+
+There is one Cart row per (user, product) (a unique constraint). Quantity
+changes are single ``F()`` UPDATEs, with an INSERT only when the row doesn't
+exist yet, so concurrent adds of the same product (double-clicks, two tabs)
+add up instead of overwriting each other or duplicating the line.
+
+Anonymous visitors get a cookie cart instead: a ``{product_id: quantity}``
+map in a signed cookie, so browsing and building a cart write nothing to the
+database. ``merge_cookie_cart`` folds it into the Cart table with one bulk
+upsert when the visitor logs in or signs up.
+"""
+import json
+
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Least
+
+from .models import Cart, Product
+
+LINE_TOTAL = ExpressionWrapper(F('quantity') * F('product__effective_price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+MAX_QUANTITY = 999
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'project.cart'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+MAX_COOKIE_LINES = 50  # keeps the cookie well under the 4KB browsers allow
+
+
+class CartError(Exception):
+    """A cart change that can't be applied (unknown product, bad quantity)."""
+
+
+def cart_lines(user):
+    """A user's cart rows with their product joined in and the line total computed by the database."""
+    return (
+        Cart.objects.filter(user=user)
+        .select_related('product')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('pk')
+    )
+
+
+def cart_total(user):
+    return Cart.objects.filter(user=user).aggregate(total=Sum(LINE_TOTAL))['total'] or 0
+
+
+def load_cart(user):
+    """Everything the cart page needs in two queries, however many lines the cart has."""
+    return list(cart_lines(user)), cart_total(user)
+
+
+def add(user, product_id, quantity=1):
+    """Add ``quantity`` of a product, up to MAX_QUANTITY; returns True if this created the cart line."""
+    rows = Cart.objects.filter(user=user, product_id=product_id)
+    increment = Least(F('quantity') + quantity, MAX_QUANTITY)
+    if rows.update(quantity=increment):
+        return False
+    try:
+        with transaction.atomic():
+            Cart.objects.create(user=user, product_id=product_id, quantity=min(quantity, MAX_QUANTITY))
+        return True
+    except IntegrityError:
+        # A racing request created the line first
+        rows.update(quantity=increment)
+        return False
+
+
+def set_quantity(user, product_id, quantity):
+    """Make the line exactly ``quantity``; zero removes it."""
+    rows = Cart.objects.filter(user=user, product_id=product_id)
+    if quantity == 0:
+        rows.delete()
+    elif not rows.update(quantity=quantity):
+        try:
+            with transaction.atomic():
+                Cart.objects.create(user=user, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            rows.update(quantity=quantity)
+
+
+def remove(user, product_id):
+    Cart.objects.filter(user=user, product_id=product_id).delete()
+
+
+def _valid_quantity(value, minimum):
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= MAX_QUANTITY
+
+
+def _resolve(changes):
+    """
+    Validate ``changes``, each ``{'product_slug', 'op', 'quantity'}`` with op
+    'add' (default), 'set' or 'remove', and return ``(op, product_id,
+    quantity)`` tuples. Every slug is resolved in one query.
+    """
+    for change in changes:
+        if not isinstance(change.get('product_slug'), str):
+            raise CartError(f"Invalid product {change.get('product_slug')!r}.")
+    slugs = {change['product_slug'] for change in changes}
+    ids = dict(Product.objects.filter(product_slug__in=slugs).values_list('product_slug', 'pk'))
+    resolved = []
+    for change in changes:
+        slug, op, quantity = change['product_slug'], change.get('op', 'add'), change.get('quantity', 1)
+        if slug not in ids:
+            raise CartError(f"Unknown product {slug!r}.")
+        if op not in ('add', 'set', 'remove'):
+            raise CartError(f"Unknown operation {op!r}.")
+        if op != 'remove' and not _valid_quantity(quantity, 1 if op == 'add' else 0):
+            raise CartError(f"Invalid quantity {quantity!r} for {slug}.")
+        resolved.append((op, ids[slug], quantity))
+    return resolved
+
+
+def apply_changes(user, changes):
+    """Apply ``changes`` (see ``_resolve``) to ``user``'s cart, all or nothing."""
+    resolved = _resolve(changes)
+    with transaction.atomic():
+        for op, product_id, quantity in resolved:
+            if op == 'add':
+                add(user, product_id, quantity)
+            elif op == 'set':
+                set_quantity(user, product_id, quantity)
+            else:
+                remove(user, product_id)
+
+
+# ---------------------------------------------------------------------------
+# Anonymous cookie carts
+# ---------------------------------------------------------------------------
+
+def read_cookie(request):
+    """The visitor's ``{product_id: quantity}``; empty if there is none or it was tampered with."""
+    try:
+        items = json.loads(request.get_signed_cookie(COOKIE_NAME, salt=COOKIE_SALT))
+        return {int(pk): int(quantity) for pk, quantity in items.items() if int(quantity) > 0}
+    except (KeyError, signing.BadSignature, ValueError, TypeError, AttributeError):
+        return {}
+
+
+def write_cookie(response, items):
+    if not items:
+        response.delete_cookie(COOKIE_NAME)
+        return
+    value = json.dumps({str(pk): quantity for pk, quantity in items.items()}, separators=(',', ':'))
+    response.set_signed_cookie(
+        COOKIE_NAME, value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+    )
+
+
+def apply_cookie_changes(items, changes):
+    """``items`` with ``changes`` applied, as a new dict; raises CartError and leaves ``items`` alone."""
+    items = dict(items)
+    for op, product_id, quantity in _resolve(changes):
+        if op == 'add':
+            items[product_id] = min(items.get(product_id, 0) + quantity, MAX_QUANTITY)
+        elif op == 'set' and quantity:
+            items[product_id] = quantity
+        else:
+            items.pop(product_id, None)
+    if len(items) > MAX_COOKIE_LINES:
+        raise CartError(f"A cart holds at most {MAX_COOKIE_LINES} different products.")
+    return items
+
+
+def cookie_lines(items):
+    """Unsaved Cart rows for ``items``, shaped like ``cart_lines`` output, in one query."""
+    products = Product.objects.in_bulk(items)
+    lines = []
+    for pk, quantity in items.items():
+        if pk in products:  # skip products deleted since they were added
+            line = Cart(product=products[pk], quantity=quantity)
+            line.line_total = quantity * line.product.effective_price
+            lines.append(line)
+    return lines
+
+
+def load_cookie_cart(items):
+    lines = cookie_lines(items)
+    return lines, sum(line.line_total for line in lines)
+
+
+def merge_cookie_cart(user, items):
+    """Add ``items`` to ``user``'s saved cart in a single upsert; lines already there are summed."""
+    if not items:
+        return
+    with transaction.atomic():
+        existing = dict(
+            Cart.objects.select_for_update()
+            .filter(user=user, product_id__in=items).values_list('product_id', 'quantity')
+        )
+        known = Product.objects.filter(pk__in=items).values_list('pk', flat=True)
+        Cart.objects.bulk_create(
+            [
+                Cart(user=user, product_id=pk, quantity=min(existing.get(pk, 0) + items[pk], MAX_QUANTITY))
+                for pk in known
+            ],
+            update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity'],
+        )
@@ -0,0 +1,150 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from . import caching, search
+from .models import Category, Product, ProductImage
+
+PAGE_SIZE = 24
+
+CATEGORY_COUNTS_KEY = 'catalog:category-counts'
+
+# Columns a product card needs; keeps listing rows narrow (no description HTML)
+CARD_FIELDS = (
+    'product_name', 'product_slug', 'product_price', 'effective_price', 'stock', 'hot_sale', 'primary_image_url',
+    'primary_image_width', 'primary_image_height', 'primary_image_placeholder',
+)
+
+
+class CursorPage:
+    """One keyset page of a listing, iterable like a Paginator page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def parse_cursor(value):
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor > 0 else None
+
+
+def product_listing():
+    return Product.objects.only(*CARD_FIELDS)
+
+
+def paginate(queryset, after=None, before=None, per_page=PAGE_SIZE):
+    """
+    Keyset pagination on the primary key: a page is one indexed range query
+    instead of OFFSET + COUNT(*). ``after``/``before`` are the pk cursors from
+    the previous page's links.
+    """
+    if before is not None:
+        rows = list(queryset.filter(pk__lt=before).order_by('-pk')[:per_page + 1])
+        more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        previous_cursor = rows[0].pk if more else None
+        next_cursor = rows[-1].pk if rows else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    rows = list(queryset.order_by('pk')[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = rows[-1].pk if more else None
+    previous_cursor = rows[0].pk if after is not None and rows else None
+    return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def paginate_ranked(queryset, query, after=None, before=None, per_page=PAGE_SIZE):
+    """
+    Search results for ``query``, most relevant first. A rank is no stable key to
+    seek on, so here the cursors are positions in the ranking: ``after=N`` starts
+    at the Nth result and ``before=N`` ends just before it.
+    """
+    start = max(0, before - per_page) if before is not None else after or 0
+    ids = search.ranked_ids(query, limit=per_page + 1, offset=start)
+    more = len(ids) > per_page
+    ids = ids[:per_page]
+    products = queryset.in_bulk(ids)
+    rows = [products[pk] for pk in ids if pk in products]
+    return CursorPage(rows, start + per_page if more else None, start or None)
+
+
+def refresh_primary_image(product_id):
+    first = ProductImage.objects.filter(product_id=product_id).order_by('pk').first()
+    url = first.resolved_url() if first else ''
+    Product.objects.filter(pk=product_id).update(
+        primary_image_url=url,
+        primary_image_width=first.width if first else None,
+        primary_image_height=first.height if first else None,
+        primary_image_placeholder=first.placeholder if first else '',
+    )
+    return url
+
+
+def category_counts():
+    """``[{name, category_slug, product_count}]`` for the menu, cached until a product or category changes."""
+    counts = cache.get(CATEGORY_COUNTS_KEY)
+    if counts is None:
+        counts = list(
+            Category.objects.annotate(product_count=Count('product'))
+            .values('name', 'category_slug', 'product_count')
+            .order_by('name')
+        )
+        cache.set(CATEGORY_COUNTS_KEY, counts, None)
+    return counts
+
+
+def invalidate_category_counts():
+    cache.delete(CATEGORY_COUNTS_KEY)
+
+
+def product_bundle(slug):
+    """
+    A product with its category and images loaded, cached until the product's
+    version changes, for at most PAGE_CACHE_SECONDS and never past the moment
+    its price next changes. Returns None when no product has that slug.
+    """
+    key = f'product:bundle:{slug}:{caching.product_version(slug)}'
+    product = cache.get(key)
+    if product is None:
+        product = (
+            Product.objects.select_related('category')
+            .prefetch_related('images')
+            .filter(product_slug=slug)
+            .first()
+        )
+        if product is None:
+            return None
+        timeout = settings.PAGE_CACHE_SECONDS
+        if product.price_expires_at:
+            until_repriced = (product.price_expires_at - timezone.now()).total_seconds()
+            timeout = max(1, min(timeout, math.ceil(until_repriced)))
+        cache.set(key, product, timeout)
+    return product
@@ -0,0 +1,178 @@
+"""
+Order placement.
+
+Stock is reserved with a conditional UPDATE (``stock >= quantity``) inside the
+order's transaction, so two buyers racing for the last unit can never both
+succeed and no row lock is held while the order row is written. An optional
+idempotency key makes a retried POST return the order it already created.
+
+Whole-cart checkout turns every Cart row into one Order with OrderLine rows:
+one batched stock UPDATE, one bulk insert for the lines and one DELETE for
+the cart, all in a single transaction. The cart rows are locked first, so a
+quantity change racing the checkout waits for it instead of being deleted
+unseen along with the line.
+
+Lines are charged at ``Product.effective_price`` (see project.pricing); a
+voucher code, if given, is redeemed inside the same transaction and taken off
+the order total.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from .cart import cart_lines
+from .models import Cart, Order, OrderLine, Product
+from . import analytics, caching, vouchers
+from .pricing import refresh_due_prices
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class OutOfStock(CheckoutError):
+    pass
+
+
+class InvalidVoucher(CheckoutError):
+    pass
+
+
+def _apply_voucher(voucher_code, subtotal):
+    """Claim ``voucher_code`` (inside the caller's transaction); returns ``(voucher, discount_amount)``."""
+    if not voucher_code:
+        return None, 0
+    try:
+        voucher = vouchers.claim(voucher_code)
+    except vouchers.VoucherError as e:
+        raise InvalidVoucher(str(e))
+    return voucher, vouchers.discount_for(voucher, subtotal)
+
+
+def reserve_stock(quantities):
+    """
+    Atomically take ``{product_id: quantity}`` units in one UPDATE. Returns
+    False if any product is short; the caller's transaction must then roll
+    back the rows that were decremented.
+    """
+    enough = Q()
+    for product_id, quantity in quantities.items():
+        enough |= Q(pk=product_id, stock__gte=quantity)
+    updated = Product.objects.filter(enough).update(
+        stock=Case(
+            *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+            default=F('stock'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    return updated == len(quantities)
+
+
+def _existing_order(user, idempotency_key):
+    if idempotency_key:
+        return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    return None
+
+
+def place_order(user, product, quantity, phoneno1, address, phoneno2=None, idempotency_key=None, voucher_code=None):
+    """Create an order and reserve its stock. Returns ``(order, created)``."""
+    if quantity < 1:
+        raise CheckoutError("Quantity must be at least 1.")
+    if refresh_due_prices():
+        product.refresh_from_db(fields=['effective_price'])
+
+    idempotency_key = idempotency_key or None
+    existing = _existing_order(user, idempotency_key)
+    if existing:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            if not reserve_stock({product.pk: quantity}):
+                raise OutOfStock(f"Only {Product.objects.values_list('stock', flat=True).get(pk=product.pk)} left in stock.")
+            subtotal = product.effective_price * quantity
+            voucher, discount_amount = _apply_voucher(voucher_code, subtotal)
+            order = Order.objects.create(
+                user=user,
+                product=product,
+                quantity=quantity,
+                phoneno1=phoneno1,
+                phoneno2=phoneno2,
+                address=address,
+                total_price=subtotal - discount_amount,
+                voucher=voucher,
+                discount_amount=discount_amount,
+                idempotency_key=idempotency_key,
+            )
+            if voucher:
+                vouchers.record(voucher, user, order)
+            line = OrderLine.objects.create(
+                order=order,
+                product=product,
+                quantity=quantity,
+                unit_price=product.effective_price,
+                line_total=subtotal,
+            )
+            analytics.record_lines([line])
+            transaction.on_commit(lambda: caching.invalidate_products([product], listings=False))
+    except IntegrityError:
+        # A concurrent retry with the same key won; its transaction already holds the stock
+        if idempotency_key:
+            return Order.objects.get(user=user, idempotency_key=idempotency_key), False
+        raise
+    return order, True
+
+
+def checkout_cart(user, phoneno1, address, phoneno2=None, idempotency_key=None, voucher_code=None):
+    """Convert all of ``user``'s cart rows into one order. Returns ``(order, created)``."""
+    refresh_due_prices()
+    idempotency_key = idempotency_key or None
+    existing = _existing_order(user, idempotency_key)
+    if existing:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            items = list(cart_lines(user).select_for_update(of=('self',)))
+            if not items:
+                raise CheckoutError("Your cart is empty.")
+
+            quantities = {}
+            for item in items:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+            if not reserve_stock(quantities):
+                raise OutOfStock("Some items in your cart are no longer in stock.")
+
+            subtotal = sum(item.line_total for item in items)
+            voucher, discount_amount = _apply_voucher(voucher_code, subtotal)
+            order = Order.objects.create(
+                user=user,
+                quantity=sum(quantities.values()),
+                phoneno1=phoneno1,
+                phoneno2=phoneno2,
+                address=address,
+                total_price=subtotal - discount_amount,
+                voucher=voucher,
+                discount_amount=discount_amount,
+                idempotency_key=idempotency_key,
+            )
+            if voucher:
+                vouchers.record(voucher, user, order)
+            lines = OrderLine.objects.bulk_create([
+                OrderLine(
+                    order=order,
+                    product_id=item.product_id,
+                    quantity=item.quantity,
+                    unit_price=item.product.effective_price,
+                    line_total=item.line_total,
+                )
+                for item in items
+            ])
+            analytics.record_lines(lines)
+            products = [item.product for item in items]
+            transaction.on_commit(lambda: caching.invalidate_products(products, listings=False))
+            Cart.objects.filter(pk__in=[item.pk for item in items]).delete()
+    except IntegrityError:
+        if idempotency_key:
+            return Order.objects.get(user=user, idempotency_key=idempotency_key), False
+        raise
+    return order, True
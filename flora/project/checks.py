@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'project.instrumentation.LocMemCache')
+# Stylesheets every storefront page links; without them the product grid renders unstyled
+REQUIRED_STATIC = ('css/product_card.css',)
+
+
+@register('caches')
+def check_shared_cache(app_configs, **kwargs):
+    # Page, card and bundle invalidation bumps versions stored in the cache; a per-process
+    # cache only sees the bumps made in its own process and serves stale pages everywhere else
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES:
+        return []
+    return [Error(
+        "The default cache is per process, so catalog changes never reach other workers or the admin process.",
+        hint="Set CACHE_BACKEND to file or redis.",
+        id='project.E001',
+    )]
+
+
+@register(Tags.staticfiles, deploy=True)
+def check_collected_static(app_configs, **kwargs):
+    # Outside DEBUG, WhiteNoise serves STATIC_ROOT only, so anything collectstatic missed is a 404
+    manifest, _ = staticfiles_storage.load_manifest()
+    return [
+        Error(
+            f"{name} is not in the collected static files.",
+            hint="Run collectstatic as part of the build (see build_files.sh).",
+            id='project.E002',
+        )
+        for name in REQUIRED_STATIC if name not in manifest
+    ]
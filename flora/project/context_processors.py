@@ -0,0 +1,5 @@
+from .catalog import category_counts
+
+
+def categories(request):
+    return {'menu_categories': category_counts()}
@@ -0,0 +1,203 @@
+"""
+Responsive image URLs.
+
+Every ``<img>`` on the storefront gets a ``srcset`` of a few fixed widths so
+phones download a 320px rendition instead of the original upload.
+
+* Cloudinary images get a delivery transformation spliced into the URL
+  (``w_<width>,c_limit,f_auto,q_auto``); Cloudinary renders and caches it.
+* Any other URL (``ProductImage.image_url``) is pointed at our own
+  ``thumbnail`` view through a signed token, which downloads the source once,
+  shrinks it with Pillow and keeps the WebP under THUMBNAIL_ROOT.
+
+Building URLs never touches the network, and ``make_thumbnail`` works on any
+file object, so both are testable offline.
+
+New ProductImages are processed in the background (``process_product_image``,
+queued by project.signals and run by ``manage.py run_jobs``): the worker
+records the intrinsic size and a blurred placeholder, and for non-Cloudinary
+sources writes every WebP and AVIF width ahead of time (AVIF only where
+Pillow supports it), so the thumbnail view only ever streams a file.
+"""
+import base64
+import hashlib
+import io
+import urllib.request
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from . import caching, catalog
+from .models import Product, ProductImage
+
+# (srcset widths, sizes, fallback width) per place an image is shown
+RENDITIONS = {
+    'card': ((160, 240, 320, 480), '(max-width: 767px) 50vw, 33vw', 320),
+    'cart': ((160, 240, 320, 480), '(max-width: 767px) 100vw, 33vw', 320),
+    'detail': ((480, 640, 960, 1280), '(max-width: 991px) 100vw, 50vw', 640),
+}
+WIDTHS = sorted({width for widths, _, _ in RENDITIONS.values() for width in widths})
+
+CLOUDINARY_HOST = 'res.cloudinary.com'
+UPLOAD_SEGMENT = '/image/upload/'
+THUMBNAIL_SALT = 'project.images.thumbnail'
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'avif': ('AVIF', 'image/avif')}
+PLACEHOLDER_WIDTH = 16
+
+
+def is_cloudinary(url):
+    return urlparse(url).netloc == CLOUDINARY_HOST and UPLOAD_SEGMENT in url
+
+
+def sized_url(url, width):
+    """``url`` resized to at most ``width`` pixels wide."""
+    if not url:
+        return ''
+    if is_cloudinary(url):
+        head, tail = url.split(UPLOAD_SEGMENT, 1)
+        return f'{head}{UPLOAD_SEGMENT}w_{width},c_limit,f_auto,q_auto/{tail}'
+    # Signer has no timestamp, so the same source always gets the same URL
+    token = signing.Signer(salt=THUMBNAIL_SALT).sign_object(url, compress=True)
+    return reverse('thumbnail', args=[width, token])
+
+
+def srcset(url, widths):
+    return ', '.join(f'{sized_url(url, width)} {width}w' for width in widths)
+
+
+def img_attrs(url, rendition, width=None, height=None, placeholder=''):
+    """
+    ``src``, ``srcset`` and ``sizes`` attributes for ``url`` shown as
+    ``rendition``, plus ``width``/``height`` (so the browser reserves the box
+    before the image loads) and a placeholder background when they're known.
+    """
+    widths, sizes, fallback = RENDITIONS[rendition]
+    if not url:
+        return ''
+    attrs = format_html(
+        'src="{}" srcset="{}" sizes="{}"', sized_url(url, fallback), srcset(url, widths), sizes,
+    )
+    if width and height:
+        attrs += format_html(' width="{}" height="{}"', width, height)
+    if placeholder:
+        attrs += format_html(' style="background: url(\'{}\') center / cover;"', placeholder)
+    return attrs
+
+
+# ---------------------------------------------------------------------------
+# Local thumbnails for non-Cloudinary sources
+# ---------------------------------------------------------------------------
+
+def source_for(token):
+    """The source URL a thumbnail token was issued for; raises ``signing.BadSignature``."""
+    return signing.Signer(salt=THUMBNAIL_SALT).unsign_object(token)
+
+
+def thumbnail_path(url, width, fmt='webp'):
+    digest = hashlib.sha256(url.encode()).hexdigest()
+    return settings.THUMBNAIL_ROOT / digest[:2] / f'{digest}-{width}.{fmt}'
+
+
+# Pillow is imported where it's used: only the worker and thumbnail view need it,
+# and it would otherwise load with the URLconf on every cold start
+def _open(source):
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(Image.open(source))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def _encode(image, width, fmt='webp'):
+    from PIL import Image
+
+    if image.width > width:
+        image = image.copy()
+        image.thumbnail((width, image.height), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, FORMATS[fmt][0], quality=80 if fmt == 'webp' else 60)
+    return out.getvalue()
+
+
+def make_thumbnail(source, width, fmt='webp'):
+    """``fmt`` bytes of the image in file object ``source``, at most ``width`` pixels wide."""
+    with _open(source) as image:
+        return _encode(image, width, fmt)
+
+
+def encodable_formats():
+    """FORMATS this Pillow can write; AVIF needs Pillow 11.2+ built with libavif."""
+    from PIL import features
+
+    return [fmt for fmt in FORMATS if fmt != 'avif' or features.check('avif')]
+
+
+def make_placeholder(image):
+    """A blurred ``data:`` URI a few hundred bytes long, for painting before the real image arrives."""
+    from PIL import Image, ImageFilter
+
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH), Image.LANCZOS)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    out = io.BytesIO()
+    tiny.save(out, 'WEBP', quality=40)
+    return 'data:image/webp;base64,' + base64.b64encode(out.getvalue()).decode()
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f'.{hashlib.md5(data).hexdigest()[:8]}.tmp')
+    tmp.write_bytes(data)
+    tmp.replace(path)  # atomic, so concurrent requests never see half a file
+
+
+def fetch(url):
+    """Download ``url`` (http/https only) into memory."""
+    if urlparse(url).scheme not in ('http', 'https'):
+        raise ValueError(f'Refusing to fetch {url!r}')
+    request = urllib.request.Request(url, headers={'User-Agent': 'flora-thumbnailer'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        data = response.read(MAX_SOURCE_BYTES + 1)
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ValueError(f'{url!r} is larger than {MAX_SOURCE_BYTES} bytes')
+    return io.BytesIO(data)
+
+
+def thumbnail(url, width):
+    """Path of the cached thumbnail for ``url``, generating it on first use."""
+    path = thumbnail_path(url, width)
+    if not path.exists():
+        _write(path, make_thumbnail(fetch(url), width))
+    return path
+
+
+def process_product_image(image_id):
+    """Background job: record size and placeholder, and pre-render derivatives for non-Cloudinary sources."""
+    image = ProductImage.objects.filter(pk=image_id).first()
+    url = image.resolved_url() if image else ''
+    if not url:
+        return
+    with _open(fetch(url)) as source:
+        if not is_cloudinary(url):
+            for width in WIDTHS:
+                for fmt in encodable_formats():  # the thumbnail view falls back to WebP
+                    _write(thumbnail_path(url, width, fmt), _encode(source, width, fmt))
+        # update() rather than save(): the save signals would queue this job again
+        ProductImage.objects.filter(pk=image_id).update(
+            width=source.width, height=source.height,
+            placeholder=make_placeholder(source), processed_at=timezone.now(),
+        )
+    catalog.refresh_primary_image(image.product_id)
+    caching.invalidate_products(Product.objects.filter(pk=image.product_id).only('pk', 'product_slug'))
+
+
+def process_product_images(image_ids):
+    """Background job for a batch of images, such as one chunk of a bulk import."""
+    for image_id in image_ids:
+        process_product_image(image_id)
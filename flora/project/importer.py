@@ -0,0 +1,292 @@
+"""
+Bulk product import from CSV or JSON Lines.
+
+Saving products one at a time costs several queries each (the slug
+uniqueness lookups, then the signal handlers for search, prices, images and
+caches), which makes a supplier catalog of thousands of SKUs impractical.
+``import_products`` streams the input instead and, per chunk of rows:
+
+* resolves category names in one lookup, creating the missing ones;
+* works out each row's slug in memory (rows without ``product_slug`` use the
+  slugified name, so importing the same file twice updates, not duplicates);
+* upserts the products with one ``bulk_create(update_conflicts=True)`` keyed
+  on the slug, and inserts image URLs the products don't already have;
+* then does what the per-row signals would have done, once for the chunk.
+
+Each chunk commits on its own, so a failure or timeout keeps the chunks
+already imported and re-running the file picks up where it stopped.
+
+Admin uploads are saved under IMPORT_ROOT and imported by the ``import_file``
+background job, so a large catalog doesn't hold a web worker (or hit the
+request timeout); the report ends up on the Job.
+
+Columns: ``product_name``, ``product_price`` and ``category`` are required;
+``product_slug``, ``stock``, ``hot_sale``, ``meta_title``, ``meta_description``,
+``product_description`` and ``image_urls`` (``|``-separated in CSV, a list in
+JSONL) are optional, and those the file leaves out are left alone on update.
+"""
+import csv
+import json
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from autoslug.utils import crop_slug
+from django.conf import settings
+from django.db import transaction
+
+from . import caching, jobs, pricing, search, suggest
+from .catalog import invalidate_category_counts
+from .models import Category, Product, ProductImage
+
+CHUNK_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+OPTIONAL_FIELDS = ('stock', 'hot_sale', 'meta_title', 'meta_description', 'product_description')
+MAX_REPORTED_ERRORS = 20
+EXPLICIT_SLUG = object()  # slug_owners marker for slugs given in a product_slug column
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = self.created = self.updated = self.images = self.skipped = 0
+        self.errors = []  # (line, message), the first MAX_REPORTED_ERRORS of them
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows in {self.seconds:.1f}s ({self.rows_per_second:.0f} rows/s): "
+            f"{self.created} created, {self.updated} updated, {self.images} images added, {self.skipped} skipped"
+        )
+
+
+def format_for(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt='csv'):
+    """``(line_number, row_dict)`` for each record in the text ``stream``."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    row = exc
+                yield line_number, row
+    else:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}.")
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def clean_row(row):
+    """The row's model values, or InvalidRow saying what is wrong with it."""
+    if not isinstance(row, dict):
+        raise InvalidRow(f"Not a JSON object ({row}).")
+    name = str(row.get('product_name') or '').strip()
+    category = str(row.get('category') or '').strip()
+    if not name or not category:
+        raise InvalidRow("product_name and category are required.")
+    try:
+        price = Decimal(str(row.get('product_price')).strip())
+    except (InvalidOperation, TypeError):
+        raise InvalidRow(f"Invalid product_price {row.get('product_price')!r}.")
+    if not price.is_finite() or price < 0:
+        raise InvalidRow(f"Invalid product_price {row.get('product_price')!r}.")
+
+    cleaned = {'product_name': name[:255], 'product_price': price, 'category': category[:255]}
+    if row.get('product_slug'):
+        cleaned['product_slug'] = str(row['product_slug']).strip()
+    if row.get('stock') not in (None, ''):
+        try:
+            cleaned['stock'] = int(row['stock'])
+        except (TypeError, ValueError):
+            raise InvalidRow(f"Invalid stock {row['stock']!r}.")
+        if cleaned['stock'] < 0:
+            raise InvalidRow(f"Invalid stock {row['stock']!r}.")
+    if row.get('hot_sale') not in (None, ''):
+        cleaned['hot_sale'] = _flag(row['hot_sale'])
+    for field in ('meta_title', 'meta_description', 'product_description'):
+        if row.get(field) not in (None, ''):
+            cleaned[field] = str(row[field])
+    urls = row.get('image_urls') or []
+    if isinstance(urls, str):
+        urls = urls.split('|')
+    cleaned['image_urls'] = [url.strip() for url in urls if isinstance(url, str) and url.strip()]
+    return cleaned
+
+
+class Importer:
+    """One import run; keeps the category map and claimed slugs across chunks."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.report = ImportReport()
+        self.categories = {}
+        self.slug_field = Product._meta.get_field('product_slug')
+        self.slug_owners = {}  # slug -> product name (or EXPLICIT_SLUG) that claimed it in this run
+
+    def run(self, stream, fmt='csv'):
+        started = time.perf_counter()
+        rows = read_rows(stream, fmt)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+            jobs.heartbeat()  # a big file can outlast jobs.STALE_AFTER
+        invalidate_category_counts()
+        transaction.on_commit(suggest.index.clear)  # rebuilt on the next lookup
+        self.report.seconds = time.perf_counter() - started
+        return self.report
+
+    def _error(self, line, message):
+        self.report.skipped += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append((line, message))
+
+    def slug_for(self, row):
+        """
+        The row's slug; raises InvalidRow when an explicit ``product_slug`` and
+        a slug generated from another row's name would land on the same product.
+        """
+        if 'product_slug' in row:
+            slug = self.slug_field.slugify(crop_slug(self.slug_field, row['product_slug']))
+            owner = self.slug_owners.setdefault(slug, EXPLICIT_SLUG)
+            if owner is not EXPLICIT_SLUG:
+                raise InvalidRow(f"Duplicate product_slug {slug!r}: an earlier row named {owner!r} has that slug.")
+            return slug
+        slug = base = self.slug_field.slugify(crop_slug(self.slug_field, row['product_name'])) or 'product'
+        if self.slug_owners.get(slug) is EXPLICIT_SLUG:
+            raise InvalidRow(f"Duplicate product_slug {slug!r}: an earlier row set it explicitly.")
+        # Names that only differ in case or punctuation share a slug; give later ones a suffix
+        n = 2
+        while self.slug_owners.setdefault(slug, row['product_name']) != row['product_name']:
+            suffix = f'-{n}'
+            slug = f'{base[:self.slug_field.max_length - len(suffix)]}{suffix}'
+            n += 1
+        return slug
+
+    def resolve_categories(self, names):
+        missing = set(names) - self.categories.keys()
+        if missing:
+            self.categories.update(Category.objects.filter(name__in=missing).values_list('name', 'pk'))
+            for name in missing - self.categories.keys():
+                # Few and far between; create() keeps AutoSlugField's slug for the category
+                self.categories[name] = Category.objects.create(name=name).pk
+
+    def import_chunk(self, chunk):
+        rows = {}
+        for line, raw in chunk:
+            try:
+                row = clean_row(raw)
+                slug = self.slug_for(row)
+            except InvalidRow as exc:
+                self._error(line, str(exc))
+                continue
+            self.report.rows += 1
+            rows[slug] = row  # the last row for a slug (the same product again) wins
+        if not rows:
+            return
+
+        update_fields = ['product_name', 'product_price', 'effective_price', 'category']
+        update_fields += [field for field in OPTIONAL_FIELDS if any(field in row for row in rows.values())]
+
+        with transaction.atomic():
+            self.resolve_categories({row['category'] for row in rows.values()})
+            existing = {
+                slug: (pk, primary_image_url)
+                for slug, pk, primary_image_url in Product.objects.filter(product_slug__in=rows)
+                .values_list('product_slug', 'pk', 'primary_image_url')
+            }
+            products = []
+            for slug, row in rows.items():
+                product = Product(
+                    product_slug=slug, category_id=self.categories[row['category']],
+                    effective_price=row['product_price'],
+                    # New products' first image is the first URL; primary_image_url isn't in update_fields
+                    primary_image_url=row['image_urls'][0] if row['image_urls'] else '',
+                    **{key: value for key, value in row.items() if key not in ('category', 'product_slug', 'image_urls')},
+                )
+                product._slug_precomputed = True
+                products.append(product)
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=['product_slug'], update_fields=update_fields,
+            )
+            product_ids = [product.pk for product in products]
+            self.report.created += len(products) - len(existing)
+            self.report.updated += len(existing)
+
+            self.add_images(products, rows)
+            had_no_image = {slug for slug, (_, url) in existing.items() if not url}
+            Product.objects.bulk_update(
+                [p for p in products if p.primary_image_url and p.product_slug in had_no_image],
+                ['primary_image_url'], batch_size=500,
+            )
+            # What the post_save handlers do per product, once for the chunk
+            pricing.refresh_prices(product_ids)
+            search.index_products(product_ids)
+            transaction.on_commit(lambda: caching.invalidate_products(products))
+
+    def add_images(self, products, rows):
+        wanted = {product.pk: rows[product.product_slug]['image_urls'] for product in products}
+        wanted = {pk: urls for pk, urls in wanted.items() if urls}
+        if not wanted:
+            return
+        have = set(ProductImage.objects.filter(product_id__in=wanted).values_list('product_id', 'image_url'))
+        new = [
+            ProductImage(product_id=pk, image_url=url)
+            for pk, urls in wanted.items()
+            for url in dict.fromkeys(urls)
+            if (pk, url) not in have
+        ]
+        ProductImage.objects.bulk_create(new)
+        self.report.images += len(new)
+        if new:
+            jobs.enqueue('project.images.process_product_images', image_ids=[image.pk for image in new])
+
+
+def import_products(stream, fmt='csv', chunk_size=CHUNK_SIZE):
+    """Import products from the text ``stream``; returns an ImportReport."""
+    return Importer(chunk_size).run(stream, fmt)
+
+
+def save_upload(upload):
+    """Copy an uploaded file under IMPORT_ROOT for ``import_file``; returns its path."""
+    settings.IMPORT_ROOT.mkdir(parents=True, exist_ok=True)
+    path = settings.IMPORT_ROOT / f'{uuid.uuid4().hex}{Path(upload.name).suffix.lower()}'
+    with open(path, 'wb') as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+    return path
+
+
+def import_file(path, fmt='csv'):
+    """Background job: import a saved upload, delete it, and return the report for the Job."""
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        report = import_products(stream, fmt)
+    Path(path).unlink()
+    return '\n'.join([str(report)] + [f"line {line}: {message}" for line, message in report.errors])
+
+
+def discard_upload(path, fmt='csv'):
+    """The import job failed for good; don't leave the upload on disk."""
+    Path(path).unlink(missing_ok=True)
+
+
+import_file.give_up = discard_upload
@@ -0,0 +1,216 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware (first in MIDDLEWARE) measures every request:
+
+* wall time;
+* database queries and their total time, through ``execute_wrapper`` on each
+  connection; queries slower than SLOW_QUERY_MS are listed, and a query shape
+  (the SQL with its placeholders) repeated N_PLUS_ONE_THRESHOLD times or more
+  is flagged as a likely N+1;
+* template render time, through the InstrumentedTemplates backend;
+* cache hits and misses, through the cache backend subclasses below.
+
+The numbers go out as a ``Server-Timing`` header (shown in the browser's
+network panel) and as one JSON log line per request on the
+``project.requests`` logger, at WARNING when something was flagged.
+
+Nothing here imports models, so settings can point at it before apps load.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache.backends import filebased, locmem, redis
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger('project.requests')
+
+_current = ContextVar('request_metrics', default=None)
+_MISSING = object()
+# "IN (%s, %s, %s)" varies with the number of ids; it is still the same query
+PLACEHOLDER_LIST = re.compile(r'\((?:%s, )*%s\)')
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = self.cache_misses = 0
+        self.shapes = Counter()
+        self.slow_queries = []
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                self.shapes[PLACEHOLDER_LIST.sub('(...)', sql)] += 1
+            if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+                self.slow_queries.append({'sql': sql[:500], 'ms': round(elapsed * 1000, 1)})
+
+    def repeated_queries(self):
+        """Query shapes run often enough to look like a per-row query (N+1)."""
+        return [
+            {'sql': shape[:500], 'count': count}
+            for shape, count in self.shapes.most_common()
+            if count >= settings.N_PLUS_ONE_THRESHOLD
+        ]
+
+    def server_timing(self, total_ms):
+        return ', '.join([
+            f'app;dur={total_ms:.1f}',
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ])
+
+
+def current():
+    """The metrics of the request being handled on this thread, or None."""
+    return _current.get()
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(total_ms)
+
+        repeated = metrics.repeated_queries()
+        match = request.resolver_match
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'ms': round(total_ms, 1),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_seconds * 1000, 1),
+            'template_ms': round(metrics.template_seconds * 1000, 1),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+        }
+        if repeated:
+            data['n_plus_one'] = repeated
+        if metrics.slow_queries:
+            data['slow_queries'] = metrics.slow_queries
+        level = logging.WARNING if repeated or metrics.slow_queries else logging.INFO
+        logger.log(level, '%s %s %s', request.method, request.path, response.status_code, extra={'data': data})
+        return response
+
+
+# ---------------------------------------------------------------------------
+# Template render time
+# ---------------------------------------------------------------------------
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return self.template.render(context, request)
+        # Only the outermost render counts; templates rendered from inside it are part of its time
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+# ---------------------------------------------------------------------------
+# Cache hits and misses
+# ---------------------------------------------------------------------------
+
+class CacheStatsMixin:
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        metrics = current()
+        if metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+
+
+class LocMemCache(CacheStatsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(CacheStatsMixin, filebased.FileBasedCache):
+    pass
+
+
+class RedisCache(CacheStatsMixin, redis.RedisCache):
+    # The others' get_many() calls get() per key; this one fetches in one round trip
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        metrics = current()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+# ---------------------------------------------------------------------------
+# Logging
+# ---------------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; a record's ``extra={'data': {...}}`` is merged in."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'data', {}),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
@@ -0,0 +1,114 @@
+"""
+A small database-backed job queue.
+
+``enqueue('project.images.process_product_image', image_id=1)`` stores a Job
+row; ``manage.py run_jobs`` claims due jobs and calls the function with the
+payload as keyword arguments. Claiming is one conditional UPDATE, so any
+number of workers can poll the same table without running a job twice.
+Failures are retried with exponential backoff up to MAX_ATTEMPTS, and jobs
+left RUNNING by a worker that died are released after STALE_AFTER. Tasks that
+can run longer than that call ``heartbeat()`` as they make progress. Whatever
+a task returns is kept in ``Job.result`` for the admin to show; a task with a
+``give_up`` attribute has it called with the payload when it fails for good.
+"""
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+MAX_ATTEMPTS = 5
+RETRY_BASE = timedelta(seconds=30)
+STALE_AFTER = timedelta(minutes=15)
+
+_current = ContextVar('current_job', default=None)
+
+
+def enqueue(task, **payload):
+    """Queue ``task`` once the current transaction commits, unless an identical job is already waiting."""
+    def create():
+        if not Job.objects.filter(task=task, payload=payload, status=Job.PENDING).exists():
+            Job.objects.create(task=task, payload=payload)
+    transaction.on_commit(create)
+
+
+def claim(limit=10):
+    """Mark up to ``limit`` due jobs RUNNING for this caller and return them."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = list(
+        Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+        .order_by('run_after', 'pk').values_list('pk', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    # Only rows still PENDING are taken, so a racing worker gets the rest
+    Job.objects.filter(pk__in=due, status=Job.PENDING).update(
+        status=Job.RUNNING, locked_by=token, locked_at=now, attempts=F('attempts') + 1,
+    )
+    return list(Job.objects.filter(locked_by=token, status=Job.RUNNING).order_by('run_after', 'pk'))
+
+
+def heartbeat():
+    """Keep the running job's claim fresh so release_stale doesn't hand it to a second worker."""
+    job = _current.get()
+    if job is not None:
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(locked_at=timezone.now())
+
+
+def _give_up(task, job):
+    try:
+        task.give_up(**job.payload)
+    except Exception:
+        job.last_error += '\nWhile giving up:\n' + traceback.format_exc()
+
+
+def run(job):
+    task = None
+    current = _current.set(job)
+    try:
+        task = import_string(job.task)
+        result = task(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + RETRY_BASE * 2 ** (job.attempts - 1)
+        else:
+            job.status = Job.FAILED
+            if hasattr(task, 'give_up'):
+                _give_up(task, job)
+    else:
+        job.status = Job.DONE
+        job.last_error = ''
+        job.result = '' if result is None else str(result)
+    finally:
+        _current.reset(current)
+    job.locked_by = ''
+    job.save(update_fields=['status', 'run_after', 'last_error', 'result', 'locked_by'])
+    return job.status == Job.DONE
+
+
+def release_stale():
+    """Put jobs whose worker vanished mid-run back in the queue."""
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - STALE_AFTER).update(
+        status=Job.PENDING, locked_by='',
+    )
+
+
+def work(limit=10):
+    """Run one batch of due jobs; returns ``(succeeded, failed)``."""
+    release_stale()
+    succeeded = failed = 0
+    for job in claim(limit):
+        if run(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
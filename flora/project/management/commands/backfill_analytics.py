@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from project import analytics
+from project.models import DailySales
+
+
+class Command(BaseCommand):
+    help = "Rebuild the sales analytics rollups from the orders table."
+
+    def handle(self, *args, **options):
+        analytics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt analytics for {DailySales.objects.count()} days."))
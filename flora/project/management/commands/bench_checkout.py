@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from project.checkout import OutOfStock, place_order
+from project.models import Category, Order, Product
+
+
+class Command(BaseCommand):
+    help = "Hammer one product with concurrent checkouts and verify stock is never oversold."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--stock', type=int, default=500)
+        parser.add_argument('--attempts', type=int, default=50, help="Checkout attempts per thread.")
+        parser.add_argument('--quantity', type=int, default=1)
+
+    def handle(self, *args, **options):
+        threads, stock, attempts, quantity = (
+            options['threads'], options['stock'], options['attempts'], options['quantity']
+        )
+        category, _ = Category.objects.get_or_create(name='Benchmark')
+        product = Product.objects.create(
+            product_name=f'Checkout benchmark {time.time_ns()}', product_price=10, category=category, stock=stock
+        )
+        users = [User.objects.create_user(f'bench-checkout-{product.pk}-{i}') for i in range(threads)]
+
+        def worker(user):
+            placed = sold_out = retries = 0
+            try:
+                for _ in range(attempts):
+                    while True:
+                        try:
+                            place_order(user, product, quantity, phoneno1='0', address='bench')
+                            placed += 1
+                        except OutOfStock:
+                            sold_out += 1
+                        except OperationalError:
+                            # SQLite reports write contention as "database is locked"; try again
+                            retries += 1
+                            continue
+                        break
+            finally:
+                connection.close()
+            return placed, sold_out, retries
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = list(pool.map(worker, users))
+            elapsed = time.perf_counter() - started
+
+            placed = sum(r[0] for r in results)
+            sold_out = sum(r[1] for r in results)
+            retries = sum(r[2] for r in results)
+            product.refresh_from_db()
+            sold = Order.objects.filter(product=product).aggregate(units=Sum('quantity'))['units'] or 0
+
+            self.stdout.write(
+                f"{threads} threads x {attempts} attempts in {elapsed:.2f}s: "
+                f"{placed} orders ({placed / elapsed:.1f}/s), {sold_out} rejected as sold out, "
+                f"{retries} lock retries, {product.stock} units left"
+            )
+            if sold + product.stock != stock or sold > stock:
+                raise CommandError(f"Oversold: {sold} units sold from an initial stock of {stock}.")
+            self.stdout.write(self.style.SUCCESS("No oversell."))
+        finally:
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+            product.delete()
@@ -0,0 +1,78 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from project import benchmarks
+from project.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency, throughput and queries per request of the storefront endpoints, in-process "
+        "with the test client and optionally over HTTP against gunicorn, and check them against the "
+        "JSON baseline. Run manage.py generate_data on a scratch database first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help=f"Only run these (repeatable): {', '.join(s.name for s in benchmarks.SCENARIOS)}.")
+        parser.add_argument('--requests', type=int, default=200, help="Timed test client requests per scenario.")
+        parser.add_argument('--server', action='store_true', help="Also load each scenario through gunicorn.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of gunicorn load per scenario.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker.")
+        parser.add_argument('--baseline', default=str(benchmarks.BASELINE_PATH))
+        parser.add_argument('--update-baseline', action='store_true', help="Save these results as the new baseline.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            context = benchmarks.Context()
+            results = {'client': benchmarks.run_client(options['scenarios'], options['requests'], context=context)}
+            if options['server']:
+                results['gunicorn'] = benchmarks.run_server(
+                    options['scenarios'], options['duration'], concurrency=options['concurrency'],
+                    workers=options['workers'], threads=options['threads'], context=context,
+                )
+        except ValueError as exc:
+            raise CommandError(exc)
+        # Not orders: the order scenario adds to them on every run
+        data = {'products': Product.objects.count(), 'users': User.objects.count()}
+
+        if options['json']:
+            self.stdout.write(json.dumps({'data': data, **results}, indent=2))
+        else:
+            self.stdout.write(', '.join(f'{count} {name}' for name, count in data.items()))
+            for mode, scenarios in results.items():
+                for name, r in scenarios.items():
+                    self.stdout.write(
+                        f"{mode:8} {name:26} {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f}ms  "
+                        f"p95 {r['p95_ms']:7.1f}ms  {r['queries']} queries  {r['errors']} errors"
+                    )
+
+        baseline = benchmarks.load_baseline(options['baseline'])
+        if options['update_baseline']:
+            baseline = baseline or {'thresholds': benchmarks.THRESHOLDS}
+            # Scenarios and modes left out of this run keep their old numbers
+            for mode, scenarios in results.items():
+                baseline[mode] = {**baseline.get(mode, {}), **scenarios}
+            baseline['data'] = data
+            benchmarks.save_baseline(baseline, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}."))
+            return
+        if baseline is None:
+            self.stdout.write(f"No baseline at {options['baseline']}; save one with --update-baseline.")
+            return
+
+        if baseline.get('data') != data:
+            self.stdout.write(self.style.WARNING(f"The baseline was measured on different data ({baseline.get('data')})."))
+        regressions = [
+            f'{mode} {regression}'
+            for mode, scenarios in results.items()
+            for regression in benchmarks.compare(scenarios, baseline.get(mode, {}), baseline.get('thresholds'))
+        ]
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Within the baseline's thresholds."))
@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from project import exporter
+from project.models import Order
+
+
+def drain(response):
+    """Read a streaming response to the end; returns ``(bytes, lines, peak_traced_bytes)``."""
+    size = lines = 0
+    tracemalloc.start()
+    try:
+        for chunk in response.streaming_content:
+            size += len(chunk)
+            lines += chunk.count(b'\n')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, lines, peak
+
+
+class Command(BaseCommand):
+    help = (
+        "Top the orders table up to --rows synthetic orders, then stream them out as CSV and JSON Lines "
+        "and report throughput and peak Python memory. Run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--ceiling-mb', type=float, default=16, help="Fail if an export's peak memory exceeds this.")
+
+    def handle(self, *args, **options):
+        missing = options['rows'] - Order.objects.count()
+        if missing > 0:
+            user, _ = User.objects.get_or_create(username='bench-export')
+            start = timezone.now() - timedelta(days=365)
+            started = time.perf_counter()
+            for offset in range(0, missing, 10_000):
+                # bulk_create skips the analytics signals; this is throwaway data
+                Order.objects.bulk_create([
+                    Order(
+                        user=user, phoneno1='03000000000', address=f'House {i}, Street {i % 97}',
+                        order_date=start + timedelta(seconds=i * 30), total_price=Decimal(100 + i % 900),
+                        status=('Pending', 'Shipped', 'Delivered')[i % 3],
+                    )
+                    for i in range(offset, min(offset + 10_000, missing))
+                ])
+            self.stdout.write(f"Created {missing} orders in {time.perf_counter() - started:.0f}s")
+
+        over = []
+        for fmt in exporter.STREAMS:
+            started = time.perf_counter()
+            response = exporter.export_response(
+                Order.objects.all(), exporter.ORDER_COLUMNS, fmt, 'orders', exporter.ORDER_ORDERING,
+            )
+            size, lines, peak = drain(response)
+            elapsed = time.perf_counter() - started
+            rows = lines - (fmt == 'csv')
+            self.stdout.write(
+                f"{fmt:6} {rows} rows, {size / 1e6:.0f}MB in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s), "
+                f"peak {peak / 1e6:.1f}MB"
+            )
+            if peak > options['ceiling_mb'] * 1e6:
+                over.append(fmt)
+        if over:
+            raise CommandError(f"{', '.join(over)} export went over {options['ceiling_mb']:.0f}MB.")
+        self.stdout.write(self.style.SUCCESS(f"Every export stayed under {options['ceiling_mb']:.0f}MB."))
@@ -0,0 +1,61 @@
+import csv
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from project.importer import CHUNK_SIZE, import_products
+from project.models import Category, Product, ProductImage
+
+COLUMNS = ('product_name', 'product_price', 'category', 'stock', 'hot_sale', 'meta_description', 'image_urls')
+
+
+def write_catalog(out, rows, run, categories=20):
+    """A synthetic supplier catalog of ``rows`` products with two image URLs each."""
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    for i in range(rows):
+        writer.writerow((
+            f'Bench {run} product {i}', f'{100 + i % 900}.00', f'Bench {run} category {i % categories}',
+            i % 50, int(i % 10 == 0), f'Synthetic product {i} for the import benchmark',
+            f'https://example.com/{run}/{i}/a.jpg|https://example.com/{run}/{i}/b.jpg',
+        ))
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a synthetic catalog (100k rows by default) twice, as new products and then as updates, "
+        "and compare with saving a sample one product at a time. Run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--baseline-rows', type=int, default=500, help="Products to save one by one for comparison.")
+
+    def handle(self, *args, **options):
+        run = time.time_ns()
+        with tempfile.TemporaryFile('w+', newline='') as catalog:
+            write_catalog(catalog, options['rows'], run)
+            for label in ('insert', 'update'):
+                catalog.seek(0)
+                report = import_products(catalog, 'csv', chunk_size=options['chunk_size'])
+                self.stdout.write(f"{label:8} {report}")
+
+        category = Category.objects.create(name=f'Bench {run} one by one')
+        started = time.perf_counter()
+        for i in range(options['baseline_rows']):
+            with transaction.atomic():
+                product = Product.objects.create(
+                    product_name=f'Bench {run} single {i}', product_price=Decimal('100.00'), category=category,
+                    stock=i % 50, hot_sale=i % 10 == 0,
+                )
+                for suffix in ('a', 'b'):
+                    ProductImage.objects.create(product=product, image_url=f'https://example.com/{run}/single/{i}/{suffix}.jpg')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"one by one: {options['baseline_rows']} rows in {elapsed:.1f}s "
+            f"({options['baseline_rows'] / elapsed:.0f} rows/s)"
+        )
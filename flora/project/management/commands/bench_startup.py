@@ -0,0 +1,78 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+# Modules a storefront cold start must never pay for
+STOREFRONT_FORBIDDEN = ('jazzmin', 'cloudinary_storage', 'rest_framework', 'PIL')
+
+
+def parse_importtime(text):
+    """``(total_ms, self_us_by_module)`` from ``python -X importtime`` output."""
+    total_us, self_us = 0, {}
+    for match in IMPORTTIME_RE.finditer(text):
+        own, cumulative, indent, module = int(match[1]), int(match[2]), match[3], match[4]
+        self_us[module] = own
+        if len(indent) == 1:  # top-level import; nested ones are inside its cumulative time
+            total_us += cumulative
+    return total_us / 1000, self_us
+
+
+def measure(entry, storefront=True):
+    """Import ``entry`` and the URLconf in a fresh interpreter; returns ``(wall_ms, import_ms, self_us_by_module)``."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'flora.settings'}
+    env['FLORA_STOREFRONT_ONLY'] = 'True' if storefront else 'False'
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {entry}, flora.urls'],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode:
+        raise CommandError(f"Importing {entry} failed:\n{result.stderr[-2000:]}")
+    import_ms, self_us = parse_importtime(result.stderr)
+    return wall_ms, import_ms, self_us
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start import time of a WSGI entry point and fail if it exceeds the budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', default='flora.wsgi_storefront', help="Module to import, as the server would.")
+        parser.add_argument('--full', action='store_true', help="Load the admin apps too (FLORA_STOREFRONT_ONLY off).")
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--budget-ms', type=float, default=750, help="Maximum median import time.")
+        parser.add_argument('--top', type=int, default=10, help="Packages to list by own import time.")
+
+    def handle(self, *args, **options):
+        storefront = not options['full']
+        runs = [measure(options['entry'], storefront) for _ in range(options['runs'])]
+        wall = statistics.median(run[0] for run in runs)
+        imports = statistics.median(run[1] for run in runs)
+        modules = runs[-1][2]
+
+        by_package = Counter()
+        for module, own in modules.items():
+            by_package[module.split('.')[0]] += own
+        self.stdout.write(
+            f"{options['entry']} ({'storefront' if storefront else 'full'}), median of {len(runs)}: "
+            f"{imports:.0f}ms importing, {wall:.0f}ms process wall time"
+        )
+        for package, own in by_package.most_common(options['top']):
+            self.stdout.write(f"  {own / 1000:7.1f}ms  {package}")
+
+        if storefront:
+            loaded = [name for name in STOREFRONT_FORBIDDEN if name in modules]
+            if loaded:
+                raise CommandError(f"Storefront cold start imported {', '.join(loaded)}.")
+        if imports > options['budget_ms']:
+            raise CommandError(f"Import time {imports:.0f}ms is over the {options['budget_ms']:.0f}ms budget.")
+        self.stdout.write(self.style.SUCCESS(f"Within the {options['budget_ms']:.0f}ms budget."))
@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from project import vouchers
+from project.models import Voucher
+
+
+def redeem_until_exhausted(voucher, users, attempts):
+    """Race ``users`` (one thread each) to redeem ``voucher``; returns ``(redeemed, rejected, retries)``."""
+
+    def worker(user):
+        redeemed = rejected = retries = 0
+        try:
+            for _ in range(attempts):
+                while True:
+                    try:
+                        with transaction.atomic():
+                            vouchers.record(vouchers.claim(voucher.code), user)
+                        redeemed += 1
+                    except vouchers.VoucherError:
+                        rejected += 1
+                    except OperationalError:
+                        # SQLite reports write contention as "database is locked"; try again
+                        retries += 1
+                        continue
+                    break
+        finally:
+            connection.close()
+        return redeemed, rejected, retries
+
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        results = list(pool.map(worker, users))
+    return tuple(sum(r[i] for r in results) for i in range(3))
+
+
+class Command(BaseCommand):
+    help = "Redeem one voucher from many threads and verify usage_limit is never exceeded."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--limit', type=int, default=200)
+        parser.add_argument('--attempts', type=int, default=50, help="Redemption attempts per thread.")
+
+    def handle(self, *args, **options):
+        threads, limit, attempts = options['threads'], options['limit'], options['attempts']
+        now = timezone.now()
+        voucher = Voucher.objects.create(
+            code=f'BENCH{time.time_ns() % 10**12}', discount_type='fixed', discount_value=1,
+            valid_from=now - timedelta(minutes=1), valid_to=now + timedelta(hours=1), usage_limit=limit,
+        )
+        users = [User.objects.create_user(f'bench-voucher-{voucher.pk}-{i}') for i in range(threads)]
+
+        started = time.perf_counter()
+        try:
+            redeemed, rejected, retries = redeem_until_exhausted(voucher, users, attempts)
+            elapsed = time.perf_counter() - started
+            voucher.refresh_from_db()
+            ledger = voucher.redemptions.count()
+
+            self.stdout.write(
+                f"[{connection.vendor}] {threads} threads x {attempts} attempts in {elapsed:.2f}s: "
+                f"{redeemed} redemptions ({redeemed / elapsed:.1f}/s), {rejected} rejected, {retries} lock retries"
+            )
+            if not (redeemed == ledger == voucher.times_used <= limit):
+                raise CommandError(
+                    f"Inconsistent voucher: {redeemed} redeemed, {ledger} ledger rows, "
+                    f"times_used={voucher.times_used}, usage_limit={limit}."
+                )
+            self.stdout.write(self.style.SUCCESS("Usage limit held."))
+        finally:
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+            voucher.delete()
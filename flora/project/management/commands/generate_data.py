@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a seeded synthetic shop (products, images, discounts, users, carts and orders) "
+        "for the benchmarks. Run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=benchmarks.SCALES, default='small')
+        parser.add_argument('--seed', type=int, default=1, help="The same seed always generates the same data.")
+        for field in benchmarks.SCALES['small']:
+            parser.add_argument(
+                f"--{field.replace('_', '-')}", type=float if field == 'discounted' else int,
+                help=f"Override the scale's {field}.",
+            )
+
+    def handle(self, *args, **options):
+        scale = {
+            field: default if options[field] is None else options[field]
+            for field, default in benchmarks.SCALES[options['scale']].items()
+        }
+        try:
+            benchmarks.generate(scale, seed=options['seed'], stdout=self.stdout)
+        except ValueError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['scale']} data with seed {options['seed']}: "
+            + ', '.join(f'{field} {value}' for field, value in scale.items())
+        ))
@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project.importer import CHUNK_SIZE, FORMATS, format_for, import_products
+
+
+class Command(BaseCommand):
+    help = "Import or update products from a CSV or JSON Lines file ('-' reads standard input)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension (CSV otherwise).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or format_for(path)
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            report = import_products(stream, fmt, chunk_size=options['chunk_size'])
+        for line, message in report.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(self.style.SUCCESS(str(report)))
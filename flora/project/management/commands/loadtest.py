@@ -0,0 +1,142 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+
+from project.models import Product
+
+# Environment overrides per configuration; see DATABASES in settings.py
+SQLITE_CONFIGS = {
+    'sqlite-reconnect': {'SQLITE_TUNED': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite-persistent': {'SQLITE_TUNED': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'sqlite-wal': {'SQLITE_TUNED': 'True', 'DB_CONN_MAX_AGE': '60'},
+}
+POSTGRES_CONFIGS = {
+    'postgres-reconnect': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'postgres-persistent': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'postgres-pool': {'DB_POOL': 'True'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server on port {port} did not come up.")
+
+
+def hammer(port, paths, concurrency, duration):
+    """GET ``paths`` round-robin from ``concurrency`` keep-alive clients; returns ``(latencies, errors)``."""
+    stop = time.monotonic() + duration
+
+    def client(offset):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        latencies, errors = [], 0
+        for path in cycle(paths[offset % len(paths):] + paths[:offset % len(paths)]):
+            if time.monotonic() >= stop:
+                break
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors += 1
+            except OSError:
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append(time.perf_counter() - started)
+        conn.close()
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    return [l for latencies, _ in results for l in latencies], sum(errors for _, errors in results)
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn once per database configuration (reconnect, persistent, WAL or pool) "
+        "against the configured database and compare requests per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=10, help="Seconds of load per configuration.")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker.")
+        parser.add_argument('--path', action='append', dest='paths', help="Path to request (repeatable).")
+        parser.add_argument('--config', action='append', dest='configs', help="Only run these configurations.")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            configs = SQLITE_CONFIGS
+            database_url = f"sqlite:///{connection.settings_dict['NAME']}"
+        else:
+            configs = POSTGRES_CONFIGS
+            database_url = os.environ.get('DATABASE_URL')
+            if not database_url:
+                raise CommandError("Set DATABASE_URL to the PostgreSQL database to test.")
+        if options['configs']:
+            configs = {name: configs[name] for name in options['configs']}
+
+        paths = options['paths'] or ['/'] + [
+            reverse('product_detail', args=[slug])
+            for slug in Product.objects.values_list('product_slug', flat=True)[:20]
+        ]
+        connection.close()  # let the servers have the database to themselves
+
+        self.stdout.write(
+            f"{connection.vendor}: {options['concurrency']} clients, {options['workers']} workers x "
+            f"{options['threads']} threads, {options['duration']:.0f}s each, {len(paths)} paths"
+        )
+        for name, overrides in configs.items():
+            port = free_port()
+            env = {
+                **os.environ, **overrides, 'DATABASE_URL': database_url,
+                'DJANGO_SETTINGS_MODULE': 'flora.settings', 'PAGE_CACHE_SECONDS': '0',
+            }
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', 'flora.wsgi_storefront:application',
+                 '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers']),
+                 '--threads', str(options['threads']), '--log-level', 'warning'],
+                cwd=settings.BASE_DIR, env=env,
+            )
+            try:
+                wait_for(port)
+                hammer(port, paths, options['concurrency'], 1)  # warm up
+                latencies, errors = hammer(port, paths, options['concurrency'], options['duration'])
+            finally:
+                server.terminate()
+                server.wait()
+            if not latencies:
+                raise CommandError(f"{name}: no successful requests.")
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            self.stdout.write(
+                f"{name:20} {len(latencies) / options['duration']:8.1f} req/s  "
+                f"p50 {statistics.median(latencies) * 1000:6.1f}ms  p95 {p95 * 1000:6.1f}ms  {errors} errors"
+            )
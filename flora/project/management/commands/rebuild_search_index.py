@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from project import search
+from project.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from scratch."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.create_index()
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Product.objects.count()} products."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from project import pricing
+
+
+class Command(BaseCommand):
+    help = "Recompute effective product prices whose discount window has opened or closed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute every product, not just the due ones.")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            changed = pricing.refresh_prices()
+        else:
+            changed = pricing.refresh_due_prices(force=True)
+        self.stdout.write(self.style.SUCCESS(f"Updated {len(changed)} product prices."))
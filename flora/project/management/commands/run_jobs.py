@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from project import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (image derivatives and the like) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the due jobs once, then exit.")
+        parser.add_argument('--batch', type=int, default=10, help="Jobs claimed per poll.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        total_ok = total_failed = 0
+        while True:
+            succeeded, failed = jobs.work(options['batch'])
+            total_ok, total_failed = total_ok + succeeded, total_failed + failed
+            if failed:
+                self.stderr.write(f"{failed} job(s) failed; see Job.last_error.")
+            if not succeeded + failed:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Ran {total_ok} job(s), {total_failed} failed."))
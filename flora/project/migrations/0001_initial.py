@@ -0,0 +1,118 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:25
+
+import autoslug.fields
+import cloudinary.models
+import django.db.models.deletion
+import django.utils.timezone
+import tinymce.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Analytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_orders', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='Hair Oil', max_length=255, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Contact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default=None, max_length=100, null=True)),
+                ('email', models.EmailField(default=None, max_length=50, null=True)),
+                ('message', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Voucher',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('discount_type', models.CharField(choices=[('percentage', 'Percentage'), ('fixed', 'Fixed Amount')], max_length=10)),
+                ('discount_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateTimeField()),
+                ('valid_to', models.DateTimeField()),
+                ('usage_limit', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=255)),
+                ('product_slug', autoslug.fields.AutoSlugField(default=None, editable=False, null=True, populate_from='product_name', unique=True)),
+                ('product_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('product_description', tinymce.models.HTMLField(blank=True, null=True)),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('hot_sale', models.BooleanField(default=False)),
+                ('meta_title', models.CharField(blank=True, max_length=255, null=True)),
+                ('meta_description', models.TextField(blank=True, null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1)),
+                ('phoneno1', models.CharField(max_length=15)),
+                ('phoneno2', models.CharField(blank=True, max_length=15, null=True)),
+                ('address', models.TextField()),
+                ('order_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered')], default='Pending', max_length=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Discount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('discount_type', models.CharField(choices=[('percentage', 'Percentage'), ('fixed', 'Fixed Amount')], max_length=10)),
+                ('discount_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discounts', to='project.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='image')),
+                ('image_url', models.URLField(blank=True, null=True, verbose_name='Image URL')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='project.product')),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_primary_image_url(apps, schema_editor):
+    Product = apps.get_model('project', 'Product')
+    ProductImage = apps.get_model('project', 'ProductImage')
+    seen = set()
+    for product_id, image, image_url in ProductImage.objects.order_by('product_id', 'pk').values_list(
+        'product_id', 'image', 'image_url'
+    ):
+        if product_id in seen:
+            continue
+        seen.add(product_id)
+        if image:
+            url = settings.CLOUDINARY_BASE_URL + image.get_prep_value()
+        else:
+            url = image_url or ''
+        Product.objects.filter(pk=product_id).update(primary_image_url=url)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_url',
+            field=models.URLField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_primary_image_url, migrations.RunPython.noop),
+    ]
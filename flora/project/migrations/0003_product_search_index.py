@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from project import search
+    search.create_index(schema_editor.connection)
+    search.rebuild(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from project import search
+    search.drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0002_product_primary_image_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
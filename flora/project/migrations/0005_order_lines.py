@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_order_lines(apps, schema_editor):
+    Order = apps.get_model('project', 'Order')
+    OrderLine = apps.get_model('project', 'OrderLine')
+    lines = []
+    for order in Order.objects.filter(product__isnull=False).iterator(chunk_size=2000):
+        quantity = max(order.quantity, 1)
+        lines.append(OrderLine(
+            order_id=order.pk,
+            product_id=order.product_id,
+            quantity=quantity,
+            unit_price=order.total_price / quantity,
+            line_total=order.total_price,
+        ))
+    OrderLine.objects.bulk_create(lines, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0004_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='project.product'),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('line_total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='project.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='project.product')),
+            ],
+        ),
+        migrations.RunPython(backfill_order_lines, migrations.RunPython.noop),
+    ]
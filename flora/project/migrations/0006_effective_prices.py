@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_effective_prices(apps, schema_editor):
+    Product = apps.get_model('project', 'Product')
+    Product.objects.update(effective_price=models.F('product_price'))
+    # Anything with a discount is due for a refresh as soon as the site runs
+    Product.objects.filter(discounts__isnull=False).update(price_expires_at=django.utils.timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0005_order_lines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='voucher',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='project.voucher'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='voucher',
+            name='times_used',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(seed_effective_prices, migrations.RunPython.noop),
+    ]
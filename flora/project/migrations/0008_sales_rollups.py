@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_voucher_redemption'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='StatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20, unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='project.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product sales',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:35
+
+import autoslug.fields
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def populate_category_slugs(apps, schema_editor):
+    Category = apps.get_model('project', 'Category')
+    taken = set()
+    for category in Category.objects.filter(category_slug__isnull=True):
+        base = slugify(category.name) or 'category'
+        slug, n = base, 1
+        while slug in taken or Category.objects.filter(category_slug=slug).exists():
+            n += 1
+            slug = f'{base}-{n}'
+        taken.add(slug)
+        category.category_slug = slug
+        category.save(update_fields=['category_slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0008_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='category_slug',
+            field=autoslug.fields.AutoSlugField(default=None, editable=False, null=True, populate_from='name', unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ),
+        migrations.RunPython(populate_category_slugs, migrations.RunPython.noop),
+    ]
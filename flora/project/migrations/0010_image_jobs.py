@@ -0,0 +1,62 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    ProductImage = apps.get_model('project', 'ProductImage')
+    Job = apps.get_model('project', 'Job')
+    Job.objects.bulk_create([
+        Job(task='project.images.process_product_image', payload={'image_id': pk})
+        for pk in ProductImage.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_category_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='placeholder',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Tiny blurred data: URI shown while loading'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(help_text='Dotted path of the function to call', max_length=200)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=64)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')],
+            },
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
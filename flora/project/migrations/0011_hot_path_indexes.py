@@ -0,0 +1,49 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_cart_rows(apps, schema_editor):
+    """Fold repeated (user, product) cart rows into the oldest one so the constraint can be added."""
+    Cart = apps.get_model('project', 'Cart')
+    duplicates = (
+        Cart.objects.values('user_id', 'product_id')
+        .annotate(n=models.Count('pk'), total=models.Sum('quantity'), keep=models.Min('pk'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        Cart.objects.filter(pk=row['keep']).update(quantity=row['total'])
+        Cart.objects.filter(user_id=row['user_id'], product_id=row['product_id']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0010_image_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_rows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['product', 'start_date', 'end_date'], name='discount_product_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'hot_sale'], name='product_category_hot_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_user_product'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-order_date'], name='order_date_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 08:58
+
+import project.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0012_order_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='product_slug',
+            field=project.models.ProductSlugField(default=None, editable=False, null=True, populate_from='product_name', unique=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+def backfill_primary_image_size(apps, schema_editor):
+    Product = apps.get_model('project', 'Product')
+    ProductImage = apps.get_model('project', 'ProductImage')
+    seen = set()
+    for product_id, width, height, placeholder in ProductImage.objects.order_by('product_id', 'pk').values_list(
+        'product_id', 'width', 'height', 'placeholder'
+    ):
+        if product_id in seen:
+            continue
+        seen.add(product_id)
+        if width:
+            Product.objects.filter(pk=product_id).update(
+                primary_image_width=width, primary_image_height=height, primary_image_placeholder=placeholder,
+            )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_product_slug_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_placeholder',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_primary_image_size, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0014_primary_image_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='result',
+            field=models.TextField(blank=True, default='', help_text='What the task returned, such as an import report'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_analytics(apps, schema_editor):
+    # The rollups only count changes made after 0008, so fold in everything older once
+    from project import analytics
+
+    analytics.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0015_job_result'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_analytics, migrations.RunPython.noop),
+    ]
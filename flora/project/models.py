@@ -8,18 +8,29 @@ from django.contrib.auth.models import User
 from django.utils.timezone import now
 from django.core.exceptions import ValidationError
 from django.utils.text import slugify
+from django.conf import settings
 
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True, default='Hair Oil')
+    category_slug = AutoSlugField(populate_from='name', unique=True, null=True, default=None)
 
     def __str__(self):
         return self.name
 
 
 
+class ProductSlugField(AutoSlugField):
+    # AutoSlugField looks up every slug to make it unique, one query per row even in bulk_create.
+    # project.importer works out unique slugs for a whole chunk itself and marks the instances.
+    def pre_save(self, instance, add):
+        if getattr(instance, '_slug_precomputed', False):
+            return self.value_from_object(instance)
+        return super().pre_save(instance, add)
+
+
 class Product(models.Model):
     product_name = models.CharField(max_length=255)
-    product_slug = AutoSlugField(populate_from='product_name', unique=True, null=True, default=None) # Add this
+    product_slug = ProductSlugField(populate_from='product_name', unique=True, null=True, default=None) # Add this
     product_price = models.DecimalField(max_digits=10, decimal_places=2)
     product_description = HTMLField(null=True, blank=True)
     category = models.ForeignKey('Category', on_delete=models.CASCADE)
@@ -27,12 +38,34 @@ class Product(models.Model):
     hot_sale = models.BooleanField(default=False)
     meta_title = models.CharField(max_length=255, blank=True, null=True)
     meta_description = models.TextField(blank=True, null=True)
+    # URL of the first ProductImage, kept in sync by project.signals so listings need no subquery
+    primary_image_url = models.URLField(max_length=500, blank=True, default='', editable=False)
+    # ...and its size and placeholder, once process_product_image has measured it
+    primary_image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_placeholder = models.TextField(blank=True, default='', editable=False)
+    # Price after the best active Discount and when that can next change; maintained by project.pricing
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    price_expires_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Category listings page by primary key within one category
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+            models.Index(fields=['category', 'hot_sale'], name='product_category_hot_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.product_slug:
             self.product_slug = slugify(self.product_name)  # Auto-generate slug if not provided
+        if self._state.adding and not self.effective_price:
+            self.effective_price = self.product_price
         super().save(*args, **kwargs)
 
+    @property
+    def is_discounted(self):
+        return self.effective_price < self.product_price
+
     def __str__(self):
         return self.product_name
 
@@ -40,10 +73,20 @@ class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField('image', blank=True, null=True)
     image_url = models.URLField('Image URL', blank=True, null=True)
+    # Filled in by the process_product_image background job
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    placeholder = models.TextField(blank=True, default='', editable=False, help_text="Tiny blurred data: URI shown while loading")
+    processed_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"Image for {self.product.product_name}"
 
+    def resolved_url(self):
+        if self.image:
+            return settings.CLOUDINARY_BASE_URL + self.image.get_prep_value()
+        return self.image_url or ''
+
     def clean(self):
         super().clean()
         if self.image and self.image_url:
@@ -58,6 +101,12 @@ class Discount(models.Model):
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            # Active-discount lookups: one product, then its date window
+            models.Index(fields=['product', 'start_date', 'end_date'], name='discount_product_window_idx'),
+        ]
+
     def __str__(self):
         return f"{self.discount_value} off on {self.product.product_name}"
 
@@ -69,23 +118,41 @@ class Voucher(models.Model):
     valid_from = models.DateTimeField()
     valid_to = models.DateTimeField()
     usage_limit = models.PositiveIntegerField(default=1)
+    times_used = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"Voucher: {self.code}"
 
 
+class VoucherRedemption(models.Model):
+    voucher = models.ForeignKey(Voucher, on_delete=models.CASCADE, related_name='redemptions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='voucher_redemptions')
+    redeemed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.voucher.code} redeemed by {self.user.username}"
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # One row per product; adding again bumps the quantity
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_user_product'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s cart - {self.product.product_name}"
 
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Set for single-product orders; whole-cart orders keep their products in OrderLine
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True)
    
     quantity = models.IntegerField(default=1)
     phoneno1 = models.CharField(max_length=15)
@@ -94,11 +161,38 @@ class Order(models.Model):
     order_date = models.DateTimeField(default=timezone.now)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=[('Pending', 'Pending'), ('Shipped', 'Shipped'), ('Delivered', 'Delivered')], default='Pending')
+    # Client-generated token so a retried checkout POST returns the original order
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    voucher = models.ForeignKey('Voucher', on_delete=models.SET_NULL, null=True, blank=True)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            # A customer's orders and the admin's status filter, newest first
+            models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),
+            models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+            # The admin's date hierarchy: first/last order and the dates in a range
+            models.Index(fields=['-order_date'], name='order_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
 
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.product_name}"
+
+
 class Contact(models.Model):
     name = models.CharField(max_length=100, null=True, default=None)
     email = models.EmailField(max_length=50, null=True, default=None)
@@ -115,4 +209,64 @@ class Analytics(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Analytics as of {self.last_updated}"
\ No newline at end of file
+        return f"Analytics as of {self.last_updated}"
+
+
+# -----------------------------
+# Rollups maintained incrementally by project.analytics
+# -----------------------------
+class DailySales(models.Model):
+    day = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+
+    def __str__(self):
+        return f"Sales on {self.day}"
+
+
+class StatusCount(models.Model):
+    status = models.CharField(max_length=20, unique=True)
+    order_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.order_count}"
+
+
+class ProductSales(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='sales')
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Product sales"
+
+    def __str__(self):
+        return f"Sales of {self.product.product_name}"
+
+
+# -----------------------------
+# Background jobs, run by manage.py run_jobs
+# -----------------------------
+class Job(models.Model):
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=200, help_text="Dotted path of the function to call")
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    result = models.TextField(blank=True, default='', help_text="What the task returned, such as an import report")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
@@ -0,0 +1,86 @@
+"""
+Effective prices.
+
+Each product's best active Discount is resolved ahead of time into
+``Product.effective_price``, together with ``price_expires_at``: the next
+moment a discount on it starts or ends. Listings and checkout read the column
+directly. Discount and Product signals recompute the affected product, and
+``refresh_due_prices`` (throttled per process, or ``manage.py refresh_prices``
+from cron) recomputes products whose window has passed.
+"""
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from .models import Discount, Product
+
+CENT = Decimal('0.01')
+
+_last_refresh = 0.0
+
+
+def apply_discount(amount, discount_type, discount_value):
+    if discount_type == 'percentage':
+        reduced = amount - amount * discount_value / 100
+    else:
+        reduced = amount - discount_value
+    return max(reduced, Decimal('0')).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def resolve_price(list_price, discounts, at):
+    """Best price among the discounts active at ``at`` and when that answer next changes."""
+    price = list_price
+    expires = None
+    for discount in discounts:
+        if discount.start_date <= at < discount.end_date:
+            price = min(price, apply_discount(list_price, discount.discount_type, discount.discount_value))
+            boundary = discount.end_date
+        elif discount.start_date > at:
+            boundary = discount.start_date
+        else:
+            continue
+        expires = boundary if expires is None else min(expires, boundary)
+    return price, expires
+
+
+def refresh_prices(product_ids=None):
+    """Recompute effective prices for the given products (all when None) in two queries plus one bulk update."""
+    at = timezone.now()
+    products = Product.objects.only('pk', 'product_slug', 'product_price', 'effective_price', 'price_expires_at')
+    discounts = Discount.objects.filter(end_date__gt=at)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(pk__in=product_ids)
+        discounts = discounts.filter(product_id__in=product_ids)
+
+    by_product = {}
+    for discount in discounts:
+        by_product.setdefault(discount.product_id, []).append(discount)
+
+    changed = []
+    for product in products:
+        price, expires = resolve_price(product.product_price, by_product.get(product.pk, ()), at)
+        if price != product.effective_price or expires != product.price_expires_at:
+            product.effective_price, product.price_expires_at = price, expires
+            changed.append(product)
+    Product.objects.bulk_update(changed, ['effective_price', 'price_expires_at'], batch_size=500)
+    if changed:
+        # Callers are often inside a transaction (admin saves, imports); see project.signals
+        transaction.on_commit(lambda: caching.invalidate_products(changed))
+    return changed
+
+
+def refresh_due_prices(force=False):
+    """Recompute products whose discount window opened or closed; at most once per PRICE_REFRESH_SECONDS."""
+    global _last_refresh
+    interval = getattr(settings, 'PRICE_REFRESH_SECONDS', 60)
+    if not force and time.monotonic() - _last_refresh < interval:
+        return []
+    _last_refresh = time.monotonic()
+    due = Product.objects.filter(price_expires_at__lte=timezone.now()).values_list('pk', flat=True)
+    return refresh_prices(list(due))
+
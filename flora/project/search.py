@@ -0,0 +1,175 @@
+"""
+Full-text product search.
+
+SQLite gets an FTS5 table keyed by product id (rowid); PostgreSQL gets a side
+table with a weighted tsvector plus a trigram index on the name for typo
+tolerance. Both are kept in sync by project.signals and can be rebuilt with
+``manage.py rebuild_search_index``. Any other backend falls back to icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'project_product_fts'
+PG_TABLE = 'project_product_search'
+
+# Column weights: name matters most, then category, then meta description
+SQLITE_RANK = f'bm25({FTS_TABLE}, 10.0, 4.0, 1.0)'
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "product_name, category_name, meta_description, tokenize='unicode61 remove_diacritics 2')",
+]
+PG_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE TABLE IF NOT EXISTS {PG_TABLE} ('
+    'product_id bigint PRIMARY KEY REFERENCES project_product(id) ON DELETE CASCADE, '
+    'product_name text NOT NULL, document tsvector NOT NULL)',
+    f'CREATE INDEX IF NOT EXISTS {PG_TABLE}_document ON {PG_TABLE} USING GIN (document)',
+    f'CREATE INDEX IF NOT EXISTS {PG_TABLE}_name_trgm ON {PG_TABLE} USING GIN (product_name gin_trgm_ops)',
+]
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _vendor(conn=None):
+    return (conn or connection).vendor
+
+
+def create_index(conn=None):
+    conn = conn or connection
+    statements = {'sqlite': SQLITE_DDL, 'postgresql': PG_DDL}.get(_vendor(conn), [])
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_index(conn=None):
+    conn = conn or connection
+    table = {'sqlite': FTS_TABLE, 'postgresql': PG_TABLE}.get(_vendor(conn))
+    if table:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+def _id_filter(product_ids, column):
+    if product_ids is None:
+        return '', []
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    return f' WHERE {column} IN ({placeholders})', list(product_ids)
+
+
+def index_products(product_ids=None, conn=None):
+    """(Re)index the given products, or every product when ``product_ids`` is None."""
+    conn = conn or connection
+    vendor = _vendor(conn)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+
+    if vendor == 'sqlite':
+        delete_where, delete_params = _id_filter(product_ids, 'rowid')
+        select_where, select_params = _id_filter(product_ids, 'p.id')
+        with conn.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}{delete_where}', delete_params)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, product_name, category_name, meta_description) '
+                "SELECT p.id, p.product_name, c.name, COALESCE(p.meta_description, '') "
+                'FROM project_product p JOIN project_category c ON c.id = p.category_id'
+                f'{select_where}',
+                select_params,
+            )
+    elif vendor == 'postgresql':
+        delete_where, delete_params = _id_filter(product_ids, 'product_id')
+        select_where, select_params = _id_filter(product_ids, 'p.id')
+        with conn.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {PG_TABLE}{delete_where}', delete_params)
+            cursor.execute(
+                f'INSERT INTO {PG_TABLE} (product_id, product_name, document) '
+                'SELECT p.id, p.product_name, '
+                "setweight(to_tsvector('simple', p.product_name), 'A') || "
+                "setweight(to_tsvector('simple', c.name), 'B') || "
+                "setweight(to_tsvector('simple', COALESCE(p.meta_description, '')), 'C') "
+                'FROM project_product p JOIN project_category c ON c.id = p.category_id'
+                f'{select_where}',
+                select_params,
+            )
+
+
+def remove_products(product_ids, conn=None):
+    conn = conn or connection
+    product_ids = list(product_ids)
+    column = {'sqlite': 'rowid', 'postgresql': 'product_id'}.get(_vendor(conn))
+    if not column or not product_ids:
+        return
+    table = FTS_TABLE if column == 'rowid' else PG_TABLE
+    where, params = _id_filter(product_ids, column)
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}{where}', params)
+
+
+def rebuild(conn=None):
+    index_products(None, conn=conn)
+
+
+def _terms(query):
+    return TOKEN_RE.findall(query or '')
+
+
+def _match_expression(terms):
+    # Quote every token so user input can never be parsed as FTS syntax; prefix-match each one
+    return ' '.join('"%s"*' % term for term in terms)
+
+
+def _tsquery(terms):
+    return ' & '.join('%s:*' % term for term in terms)
+
+
+def _match_sql(terms):
+    """SQL selecting matching product ids in rank order, with its params."""
+    vendor = _vendor()
+    if vendor == 'sqlite':
+        return (
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY {SQLITE_RANK}',
+            [_match_expression(terms)],
+        )
+    if vendor == 'postgresql':
+        name = ' '.join(terms)
+        return (
+            f"SELECT product_id FROM {PG_TABLE} WHERE document @@ to_tsquery('simple', %s) OR product_name %% %s "
+            f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC, similarity(product_name, %s) DESC",
+            [_tsquery(terms), name, _tsquery(terms), name],
+        )
+    return None, None
+
+
+def filter_queryset(queryset, query):
+    """
+    Restrict a Product queryset to search matches without leaving the database.
+    The matches come back in the queryset's order, not by relevance; the storefront
+    lists them with ``catalog.paginate_ranked`` instead.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset
+    sql, params = _match_sql(terms)
+    if sql is None:
+        return queryset.filter(product_name__icontains=query)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def ranked_ids(query, limit=10, offset=0):
+    """Best-matching product ids, most relevant first, skipping the first ``offset``."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    sql, params = _match_sql(terms)
+    if sql is None:
+        from .models import Product
+        matches = Product.objects.filter(product_name__icontains=query).order_by('pk').values_list('pk', flat=True)
+        return list(matches[offset:offset + limit])
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} LIMIT %s OFFSET %s', params + [limit, offset])
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Category, Discount, Order, OrderLine, Product, ProductImage
+from .catalog import invalidate_category_counts, refresh_primary_image
+from . import analytics, caching, jobs, pricing, search, suggest
+
+
+# -----------------------------
+# ProductImage -> Product.primary_image_url
+# -----------------------------
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_primary_image(sender, instance, **kwargs):
+    refresh_primary_image(instance.product_id)
+
+
+# -----------------------------
+# ProductImage -> background derivatives
+# -----------------------------
+@receiver(post_save, sender=ProductImage)
+def queue_image_processing(sender, instance, **kwargs):
+    jobs.enqueue('project.images.process_product_image', image_id=instance.pk)
+
+
+# -----------------------------
+# Full-text search index
+# -----------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created:
+        search.index_products(instance.product_set.values_list('pk', flat=True))
+
+
+# -----------------------------
+# In-memory suggestion index
+# -----------------------------
+@receiver(post_save, sender=Product)
+def update_suggestions(sender, instance, **kwargs):
+    pk, name, slug = instance.pk, instance.product_name, instance.product_slug
+    transaction.on_commit(lambda: suggest.index.update(pk, name, slug))
+
+
+@receiver(post_delete, sender=Product)
+def remove_suggestion(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest.index.remove(pk))
+
+
+# -----------------------------
+# Effective prices
+# -----------------------------
+@receiver(post_save, sender=Product)
+def reprice_product(sender, instance, **kwargs):
+    for product in pricing.refresh_prices([instance.pk]):
+        instance.effective_price, instance.price_expires_at = product.effective_price, product.price_expires_at
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def reprice_discounted_product(sender, instance, **kwargs):
+    pricing.refresh_prices([instance.product_id])
+
+
+# -----------------------------
+# Sales analytics rollups
+# -----------------------------
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._previous_status = None
+    if instance.pk:
+        instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def roll_up_order(sender, instance, created, **kwargs):
+    if created:
+        analytics.record_order(instance)
+    elif instance._previous_status:
+        analytics.record_status_change(instance._previous_status, instance.status)
+
+
+@receiver(post_delete, sender=Order)
+def roll_back_order(sender, instance, **kwargs):
+    analytics.record_order(instance, sign=-1)
+
+
+@receiver(post_delete, sender=OrderLine)
+def roll_back_order_line(sender, instance, **kwargs):
+    analytics.record_lines([instance], sign=-1)
+
+
+@receiver(post_save, sender=User)
+def count_new_user(sender, instance, created, **kwargs):
+    if created:
+        analytics.record_user()
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    analytics.record_user(sign=-1)
+
+
+# -----------------------------
+# Cached category counts
+# -----------------------------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reset_category_counts(sender, **kwargs):
+    invalidate_category_counts()
+
+
+# -----------------------------
+# Page and fragment caches
+# -----------------------------
+# After commit: a request between the version bump and the commit would cache the old row under the new version
+def invalidate_on_commit(products):
+    products = list(products)
+    transaction.on_commit(lambda: caching.invalidate_products(products))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_pages(sender, instance, **kwargs):
+    invalidate_on_commit([instance])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_related_product_pages(sender, instance, **kwargs):
+    invalidate_on_commit(Product.objects.filter(pk=instance.product_id).only('pk', 'product_slug'))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    invalidate_on_commit(instance.product_set.only('pk', 'product_slug'))
@@ -0,0 +1,16 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    """
+    Hashed, precompressed static files. Before ``collectstatic`` has run
+    (development, tests) there is no manifest, so plain names are used instead
+    of failing the page.
+    """
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            return name
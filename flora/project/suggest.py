@@ -0,0 +1,204 @@
+"""
+In-process prefix index behind /search-suggestions/.
+
+Every word position of every product name is stored as a lowercase key in one
+sorted list, so a prefix lookup is a bisect plus a short scan. Misspelt words
+fall back to a one-edit match against the name vocabulary: every word prefix
+is also stored under each of its one-letter deletions, so the candidates for
+a typed word are the few sharing a deletion with it, never the whole
+vocabulary (the symmetric-delete trick). The index is built
+on first use and patched by project.signals after each Product commit; other
+worker processes pick changes up on their next rebuild (``SUGGEST_INDEX_TTL``).
+"""
+import bisect
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+from .search import TOKEN_RE
+
+# Word prefixes up to this long go into the typo map; longer typed words are looked up by theirs
+TYPO_PREFIX_MAX = 10
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def within_one_edit(a, b):
+    """True if ``a`` and ``b`` differ by one insert, delete, substitution or adjacent swap."""
+    if len(a) == len(b):
+        diffs = [k for k in range(len(a)) if a[k] != b[k]]
+        if len(diffs) == 2 and diffs[1] == diffs[0] + 1:
+            return a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+        return len(diffs) <= 1
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return edits + (len(b) - j) <= 1
+
+
+def deletions(text):
+    """``text`` and every string one deleted letter away from it."""
+    return {text} | {text[:k] + text[k + 1:] for k in range(len(text))}
+
+
+def typo_keys(word):
+    """Keys a word is filed under in the typo map: its prefixes (2 letters on) and their deletions."""
+    keys = set()
+    for end in range(2, min(len(word), TYPO_PREFIX_MAX) + 1):
+        keys |= deletions(word[:end])
+    return keys
+
+
+class SuggestionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []        # sorted (key, pk) tuples, one per word start
+        self._products = {}    # pk -> (name, slug)
+        self._words = {}       # word -> set of pks, for typo fallback
+        self._typos = {}       # typo_keys() key -> set of words
+        self._built_at = None
+
+    # -- building ---------------------------------------------------------
+
+    @staticmethod
+    def _entries(pk, name):
+        normalized = normalize(name)
+        starts = [m.start() for m in TOKEN_RE.finditer(normalized)]
+        return [(normalized[start:], pk) for start in starts], TOKEN_RE.findall(normalized)
+
+    def build(self):
+        from .models import Product
+        keys, products, words, typos = [], {}, {}, {}
+        for pk, name, slug in Product.objects.values_list('pk', 'product_name', 'product_slug').iterator():
+            entries, tokens = self._entries(pk, name)
+            keys.extend(entries)
+            products[pk] = (name, slug)
+            for token in tokens:
+                words.setdefault(token, set()).add(pk)
+        for word in words:
+            for key in typo_keys(word):
+                typos.setdefault(key, set()).add(word)
+        keys.sort()
+        with self._lock:
+            self._keys, self._products, self._words, self._typos = keys, products, words, typos
+            self._built_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._keys, self._products, self._words, self._typos = [], {}, {}, {}
+            self._built_at = None
+
+    def _ensure_built(self):
+        ttl = getattr(settings, 'SUGGEST_INDEX_TTL', 300)
+        if self._built_at is None or time.monotonic() - self._built_at > ttl:
+            self.build()
+
+    # -- incremental updates ----------------------------------------------
+
+    def _remove_locked(self, pk):
+        old = self._products.pop(pk, None)
+        if old is None:
+            return
+        entries, tokens = self._entries(pk, old[0])
+        for entry in entries:
+            i = bisect.bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+        for token in tokens:
+            pks = self._words.get(token)
+            if pks:
+                pks.discard(pk)
+                if not pks:
+                    del self._words[token]
+                    for key in typo_keys(token):
+                        spellings = self._typos.get(key)
+                        if spellings:
+                            spellings.discard(token)
+                            if not spellings:
+                                del self._typos[key]
+
+    def update(self, pk, name, slug):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._remove_locked(pk)
+            entries, tokens = self._entries(pk, name)
+            for entry in entries:
+                bisect.insort(self._keys, entry)
+            for token in tokens:
+                if token not in self._words:
+                    for key in typo_keys(token):
+                        self._typos.setdefault(key, set()).add(token)
+                self._words.setdefault(token, set()).add(pk)
+            self._products[pk] = (name, slug)
+
+    def remove(self, pk):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._remove_locked(pk)
+
+    # -- lookups ----------------------------------------------------------
+
+    def lookup(self, query, limit=5):
+        self._ensure_built()
+        prefix = ' '.join(TOKEN_RE.findall(normalize(query)))
+        if not prefix:
+            return []
+        cap = limit * 4  # candidates to rank; a bounded window keeps short prefixes and common words cheap
+        last = prefix.rsplit(' ', 1)[-1]
+
+        ranked = []
+        seen = set()
+        with self._lock:
+            keys, products = self._keys, self._products
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and len(ranked) < cap and keys[i][0].startswith(prefix):
+                pk = keys[i][1]
+                if pk not in seen:
+                    seen.add(pk)
+                    name, slug = products[pk]
+                    ranked.append((0 if normalize(name).startswith(prefix) else 1, name, slug))
+                i += 1
+            typo_fallback = len(ranked) < limit and len(last) >= 3
+            if typo_fallback:
+                candidates = set()
+                for key in deletions(last[:TYPO_PREFIX_MAX]):
+                    candidates |= self._typos.get(key, set())
+
+        if typo_fallback:
+            # Checked outside the lock: other lookups and updates needn't wait on the edit distances
+            close = sorted(
+                word for word in candidates
+                if within_one_edit(last, word[:len(last)]) or within_one_edit(last, word)
+            )
+            with self._lock:
+                for word in close:
+                    for pk in self._words.get(word, ()):
+                        if len(ranked) >= cap:
+                            break
+                        if pk not in seen and pk in self._products:
+                            seen.add(pk)
+                            ranked.append((2, *self._products[pk]))
+
+        ranked.sort()
+        return [{"name": name, "slug": slug} for _, name, slug in ranked[:limit]]
+
+
+index = SuggestionIndex()
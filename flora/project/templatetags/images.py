@@ -0,0 +1,11 @@
+from django import template
+
+from project import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def img_attrs(url, rendition, width=None, height=None, placeholder=''):
+    """``{% img_attrs product.primary_image_url 'card' %}`` -> src, srcset and sizes (and size/placeholder if given)."""
+    return images.img_attrs(url, rendition, width, height, placeholder)
@@ -1,3 +1,1546 @@
-from django.test import TestCase
+import csv
+import importlib
+import json
+import logging
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from django.urls import reverse
+
+from . import (
+    analytics, benchmarks, caching, cart as cart_service, checkout, checks, exporter, images, instrumentation, jobs,
+    pricing, search, suggest, vouchers,
+)
+from .catalog import category_counts, paginate, paginate_ranked, product_bundle, product_listing
+from .cart import load_cart
+from .checkout import InvalidVoucher, OutOfStock, checkout_cart, place_order
+from .management.commands.bench_export import drain
+from .management.commands.bench_startup import parse_importtime
+from .management.commands.bench_vouchers import redeem_until_exhausted
+from .models import (
+    Analytics, Cart, Category, Contact, DailySales, Discount, Job, Order, OrderLine, Product, ProductImage, ProductSales,
+    StatusCount, Voucher,
+)
+
+
+def make_products(count, category=None, **kwargs):
+    category = category or Category.objects.get_or_create(name='Hair Oil')[0]
+    return [
+        Product.objects.create(
+            product_name=f'Product {i}', product_price=Decimal('100.00'), category=category, stock=10, **kwargs
+        )
+        for i in range(count)
+    ]
+
+
+class CatalogPaginationTests(TestCase):
+    def setUp(self):
+        self.products = make_products(30)
+
+    def test_pages_walk_forward_and_back(self):
+        first = paginate(product_listing(), per_page=12)
+        self.assertEqual([p.pk for p in first], [p.pk for p in self.products[:12]])
+        self.assertFalse(first.has_previous)
+        self.assertTrue(first.has_next)
+
+        second = paginate(product_listing(), after=first.next_cursor, per_page=12)
+        self.assertEqual([p.pk for p in second], [p.pk for p in self.products[12:24]])
+
+        last = paginate(product_listing(), after=second.next_cursor, per_page=12)
+        self.assertEqual(len(last), 6)
+        self.assertFalse(last.has_next)
+
+        back = paginate(product_listing(), before=last.previous_cursor, per_page=12)
+        self.assertEqual([p.pk for p in back], [p.pk for p in second])
+        self.assertTrue(back.has_previous)
+
+    def test_page_is_a_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(paginate(product_listing()))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_home_renders_cursor_links(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'after={self.products[23].pk}')
+
+
+class PrimaryImageTests(TestCase):
+    def test_primary_image_follows_image_rows(self):
+        product = make_products(1)[0]
+        first = ProductImage.objects.create(product=product, image_url='https://example.com/a.jpg')
+        ProductImage.objects.create(product=product, image_url='https://example.com/b.jpg')
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_url, 'https://example.com/a.jpg')
+
+        first.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.primary_image_url, 'https://example.com/b.jpg')
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        oils = Category.objects.create(name='Oils')
+        soaps = Category.objects.create(name='Soaps')
+        self.rose = Product.objects.create(
+            product_name='Rose Hair Oil', product_price=Decimal('500.00'), category=oils
+        )
+        self.neem = Product.objects.create(
+            product_name='Neem Soap', product_price=Decimal('150.00'), category=soaps,
+            meta_description='Herbal bar with rose water',
+        )
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(search.ranked_ids('rose'), [self.rose.pk, self.neem.pk])
+
+    def test_prefix_and_category_matches(self):
+        self.assertEqual(search.ranked_ids('soa'), [self.neem.pk])
+        ids = search.filter_queryset(Product.objects.all(), 'oils').values_list('pk', flat=True)
+        self.assertEqual(list(ids), [self.rose.pk])
+
+    def test_storefront_lists_results_by_relevance(self):
+        water = Product.objects.create(product_name='Rose Water', product_price=Decimal('90.00'), category=self.neem.category)
+        content = self.client.get(reverse('home'), {'searchbox': 'rose'}).content.decode()
+        # Neem Soap only mentions rose in its description; it was added before Rose Water but ranks below it
+        self.assertLess(content.index('Rose Water'), content.index('Neem Soap'))
+
+        pages, cursor = [], None
+        while True:
+            page = paginate_ranked(Product.objects.all(), 'rose', after=cursor, per_page=2)
+            pages.append([product.pk for product in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(sum(pages, []), search.ranked_ids('rose'))
+        self.assertEqual(pages[-1], [self.neem.pk])
+        self.assertEqual(
+            [p.pk for p in paginate_ranked(Product.objects.all(), 'rose', before=page.previous_cursor, per_page=2)],
+            pages[0],
+        )
+
+    def test_index_follows_saves_and_deletes(self):
+        self.rose.product_name = 'Jasmine Hair Oil'
+        self.rose.save()
+        self.assertEqual(search.ranked_ids('jasmine'), [self.rose.pk])
+        self.rose.delete()
+        self.assertEqual(search.ranked_ids('jasmine'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(search.ranked_ids('rose" *('), [self.rose.pk, self.neem.pk])
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.ranked_ids('neem'), [self.neem.pk])
+
+
+class SuggestionIndexTests(TestCase):
+    def setUp(self):
+        suggest.index.clear()
+        category = Category.objects.create(name='Oils')
+        self.rose = Product.objects.create(product_name='Rose Hair Oil', product_price=Decimal('5'), category=category)
+        self.argan = Product.objects.create(product_name='Argan Oil', product_price=Decimal('5'), category=category)
+
+    def tearDown(self):
+        suggest.index.clear()
+
+    def test_prefix_matches_name_starts_first(self):
+        names = [s['name'] for s in suggest.index.lookup('oi')]
+        self.assertEqual(names, ['Argan Oil', 'Rose Hair Oil'])
+        self.assertEqual([s['name'] for s in suggest.index.lookup('ros')], ['Rose Hair Oil'])
+
+    def test_typo_tolerance(self):
+        self.assertEqual([s['name'] for s in suggest.index.lookup('argna')], ['Argan Oil'])
+
+    def test_typo_fallback_only_checks_words_sharing_a_deletion(self):
+        category = Category.objects.get()
+        Product.objects.bulk_create([
+            Product(product_name=f'Blend {i:04d}x', product_slug=f'blend-{i}', product_price=Decimal('5'), category=category)
+            for i in range(2000)
+        ])
+        suggest.index.clear()
+        with mock.patch.object(suggest, 'within_one_edit', wraps=suggest.within_one_edit) as check:
+            self.assertEqual([s['name'] for s in suggest.index.lookup('agran')], ['Argan Oil'])
+        self.assertLess(check.call_count, 10)
+        self.assertEqual(len(suggest.index.lookup('blnd', limit=5)), 5)
+
+    def test_incremental_updates_after_commit(self):
+        suggest.index.lookup('x')  # build
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rose.product_name = 'Jasmine Oil'
+            self.rose.save()
+        with self.assertNumQueries(0):
+            self.assertEqual([s['name'] for s in suggest.index.lookup('jas')], ['Jasmine Oil'])
+            self.assertEqual([s['name'] for s in suggest.index.lookup('jasmnie')], ['Jasmine Oil'])
+            self.assertEqual(suggest.index.lookup('rose'), [])
+            self.assertEqual(suggest.index.lookup('roes'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.argan.delete()
+        self.assertEqual(suggest.index.lookup('argan'), [])
+
+    def test_endpoint_is_cacheable(self):
+        response = self.client.get(reverse('search_suggestions'), {'q': 'rose'})
+        self.assertEqual(response.json(), [{'name': 'Rose Hair Oil', 'slug': self.rose.product_slug}])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+
+class CartLoaderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='pw')
+        self.products = make_products(6)
+        for product in self.products:
+            ProductImage.objects.create(product=product, image_url=f'https://example.com/{product.pk}.jpg')
+        self.client.force_login(self.user)
+
+    def cart_page_queries(self):
+        category_counts()  # warm the cached menu so only the cart itself is measured
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        Cart.objects.create(user=self.user, product=self.products[0])
+        small = self.cart_page_queries()
+        for product in self.products[1:]:
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        self.assertEqual(self.cart_page_queries(), small)
+
+    def test_totals_are_computed_in_the_database(self):
+        Cart.objects.create(user=self.user, product=self.products[0], quantity=3)
+        Cart.objects.create(user=self.user, product=self.products[1])
+        lines, total = load_cart(self.user)
+        self.assertEqual([line.line_total for line in lines], [Decimal('300.00'), Decimal('100.00')])
+        self.assertEqual(total, Decimal('400.00'))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.product = make_products(1)[0]
+        self.product.product_price = Decimal('99.50')
+        self.product.stock = 3
+        self.product.save()
+
+    def test_reserves_stock_and_keeps_decimal_price(self):
+        order, created = place_order(self.user, self.product, 2, phoneno1='123', address='Street 1')
+        self.assertTrue(created)
+        self.assertEqual(order.total_price, Decimal('199.00'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_refuses_to_oversell(self):
+        place_order(self.user, self.product, 3, phoneno1='123', address='Street 1')
+        with self.assertRaises(OutOfStock):
+            place_order(self.user, self.product, 1, phoneno1='123', address='Street 1')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_retried_post_returns_the_same_order(self):
+        self.client.force_login(self.user)
+        data = {'quantity': 1, 'phoneno1': '123', 'address': 'Street 1', 'idempotency_key': 'abc'}
+        url = reverse('order', args=[self.product.product_slug])
+        self.client.post(url, data)
+        self.client.post(url, data)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+
+class CartCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.products = make_products(5)
+        pricing.refresh_due_prices(force=True)  # keep the throttled refresh out of query counts
+
+    def fill_cart(self, products, quantity=2):
+        for product in products:
+            Cart.objects.create(user=self.user, product=product, quantity=quantity)
+
+    def checkout_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            checkout_cart(self.user, phoneno1='123', address='Street 1')
+        return len(ctx.captured_queries)
+
+    def test_whole_cart_becomes_one_order(self):
+        self.fill_cart(self.products[:3])
+        order, created = checkout_cart(self.user, phoneno1='123', address='Street 1')
+        self.assertTrue(created)
+        self.assertEqual(order.total_price, Decimal('600.00'))
+        self.assertEqual(order.lines.count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products[:3]]).values_list('stock', flat=True)),
+            [8, 8, 8],
+        )
+
+    def test_query_count_is_independent_of_cart_size(self):
+        self.fill_cart(self.products)
+        self.checkout_queries()  # first order creates the analytics rollup rows
+        self.fill_cart(self.products[:1])
+        small = self.checkout_queries()
+        self.fill_cart(self.products)
+        self.assertEqual(self.checkout_queries(), small)
+
+    def test_short_stock_rolls_everything_back(self):
+        self.fill_cart(self.products[:2])
+        Product.objects.filter(pk=self.products[1].pk).update(stock=1)
+        with self.assertRaises(OutOfStock):
+            checkout_cart(self.user, phoneno1='123', address='Street 1')
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 10)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(OrderLine.objects.exists())
+
+    def test_checkout_endpoint(self):
+        self.fill_cart(self.products[:2])
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('cart_checkout'), {'phoneno1': '123', 'address': 'Street 1'})
+        self.assertRedirects(response, reverse('cart'))
+        self.assertEqual(Order.objects.get(user=self.user).lines.count(), 2)
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.product = make_products(1)[0]
+        self.now = timezone.now()
+
+    def discount(self, discount_type, value, start, end):
+        return Discount.objects.create(
+            product=self.product, discount_type=discount_type, discount_value=Decimal(value),
+            start_date=self.now + start, end_date=self.now + end,
+        )
+
+    def test_best_active_discount_is_materialized(self):
+        self.discount('percentage', '10', -timedelta(days=1), timedelta(days=1))
+        self.discount('fixed', '25', -timedelta(days=1), timedelta(hours=2))
+        self.discount('fixed', '90', timedelta(days=3), timedelta(days=4))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.effective_price, Decimal('75.00'))
+        self.assertEqual(self.product.price_expires_at, self.now + timedelta(hours=2))
+
+    def test_expired_window_is_refreshed(self):
+        discount = self.discount('fixed', '30', -timedelta(days=1), timedelta(days=1))
+        Discount.objects.filter(pk=discount.pk).update(end_date=self.now - timedelta(seconds=1))
+        Product.objects.filter(pk=self.product.pk).update(price_expires_at=self.now - timedelta(seconds=1))
+        pricing.refresh_due_prices(force=True)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.effective_price, Decimal('100.00'))
+        self.assertIsNone(self.product.price_expires_at)
+
+    def test_checkout_charges_effective_price_and_voucher(self):
+        self.discount('percentage', '20', -timedelta(days=1), timedelta(days=1))
+        Voucher.objects.create(
+            code='SAVE10', discount_type='fixed', discount_value=Decimal('10'),
+            valid_from=self.now - timedelta(days=1), valid_to=self.now + timedelta(days=1), usage_limit=1,
+        )
+        self.product.refresh_from_db()
+        order, _ = place_order(self.user, self.product, 2, phoneno1='1', address='A', voucher_code='save10')
+        self.assertEqual(order.total_price, Decimal('150.00'))
+        self.assertEqual(order.discount_amount, Decimal('10.00'))
+        with self.assertRaises(InvalidVoucher):
+            place_order(self.user, self.product, 1, phoneno1='1', address='A', voucher_code='SAVE10')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+
+def make_voucher(code='SAVE10', usage_limit=1, **kwargs):
+    now = timezone.now()
+    return Voucher.objects.create(
+        code=code, discount_type='fixed', discount_value=Decimal('10'), usage_limit=usage_limit,
+        valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1), **kwargs
+    )
+
+
+class VoucherRedemptionTests(TestCase):
+    def test_claim_stops_at_the_limit_and_ledger_matches(self):
+        user = User.objects.create_user('buyer')
+        voucher = make_voucher(usage_limit=2)
+        for _ in range(2):
+            vouchers.record(vouchers.claim('save10'), user)
+        with self.assertRaises(vouchers.VoucherError):
+            vouchers.claim('SAVE10')
+        voucher.refresh_from_db()
+        self.assertEqual(voucher.times_used, 2)
+        self.assertEqual(voucher.redemptions.count(), 2)
+
+    def test_codes_differing_only_in_case_claim_one_voucher(self):
+        upper = make_voucher(usage_limit=5)
+        lower = make_voucher(code='save10', usage_limit=5)
+        self.assertEqual(vouchers.claim('save10'), lower)
+        self.assertEqual(vouchers.claim('SAVE10'), upper)
+        self.assertEqual(vouchers.claim('Save10'), upper)
+        upper.refresh_from_db()
+        lower.refresh_from_db()
+        self.assertEqual((upper.times_used, lower.times_used), (2, 1))
+
+    def test_expired_voucher_is_rejected(self):
+        now = timezone.now()
+        Voucher.objects.create(
+            code='OLD', discount_type='fixed', discount_value=Decimal('10'),
+            valid_from=now - timedelta(days=2), valid_to=now - timedelta(days=1),
+        )
+        with self.assertRaises(vouchers.VoucherError):
+            vouchers.claim('OLD')
+
+
+class VoucherConcurrencyTests(TransactionTestCase):
+    def test_concurrent_redemptions_never_exceed_the_limit(self):
+        voucher = make_voucher(usage_limit=25)
+        users = [User(username=f'racer-{i}') for i in range(8)]
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(username__startswith='racer-'))
+
+        redeemed, rejected, _ = redeem_until_exhausted(voucher, users, attempts=10)
+
+        voucher.refresh_from_db()
+        self.assertEqual(redeemed, 25)
+        self.assertEqual(rejected, 8 * 10 - 25)
+        self.assertEqual(voucher.times_used, 25)
+        self.assertEqual(voucher.redemptions.count(), 25)
+
+
+class AnalyticsRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.products = make_products(2)
+
+    def snapshot(self):
+        return (
+            list(DailySales.objects.order_by('day').values_list('day', 'order_count', 'total_sales')),
+            list(StatusCount.objects.filter(order_count__gt=0).order_by('status').values_list('status', 'order_count')),
+            list(ProductSales.objects.order_by('product_id').values_list('product_id', 'units_sold', 'revenue')),
+            Analytics.objects.values_list('total_orders', 'total_sales', 'total_users').get(),
+        )
+
+    def test_rollups_follow_orders(self):
+        place_order(self.user, self.products[0], 2, phoneno1='1', address='A')
+        Cart.objects.create(user=self.user, product=self.products[0])
+        Cart.objects.create(user=self.user, product=self.products[1], quantity=3)
+        order, _ = checkout_cart(self.user, phoneno1='1', address='A')
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.order_count, day.total_sales), (2, Decimal('600.00')))
+        self.assertEqual(ProductSales.objects.get(product=self.products[0]).units_sold, 3)
+        self.assertEqual(StatusCount.objects.get(status='Pending').order_count, 2)
+
+        order.status = 'Shipped'
+        order.save()
+        self.assertEqual(StatusCount.objects.get(status='Pending').order_count, 1)
+        self.assertEqual(StatusCount.objects.get(status='Shipped').order_count, 1)
+
+        incremental = self.snapshot()
+        analytics.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        order.delete()
+        self.assertEqual(DailySales.objects.get().total_sales, Decimal('200.00'))
+        self.assertEqual(ProductSales.objects.get(product=self.products[1]).units_sold, 0)
+
+    def test_deleting_rows_older_than_the_rollups(self):
+        place_order(self.user, self.products[0], 1, phoneno1='1', address='A')
+        # As if both were created before the rollup tables existed
+        Analytics.objects.update(total_users=0, total_orders=0)
+        Order.objects.get().delete()
+        self.user.delete()
+        self.assertEqual(Analytics.objects.values_list('total_orders', 'total_users').get(), (0, 0))
+
+    def test_migration_backfills_existing_data(self):
+        place_order(self.user, self.products[0], 2, phoneno1='1', address='A')
+        expected = self.snapshot()
+        for model in (DailySales, StatusCount, ProductSales, Analytics):
+            model.objects.all().delete()
+        migration = importlib.import_module('project.migrations.0016_backfill_analytics')
+        migration.backfill_analytics(django_apps, None)
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_dashboard_reads_rollups_only(self):
+        admin_user = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin_user)
+        place_order(self.user, self.products[0], 1, phoneno1='1', address='A')
+        url = reverse('admin:project_analytics_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if '"project_order"' in q['sql']])
+
+
+class CategoryBrowsingTests(TestCase):
+    def setUp(self):
+        self.oils = Category.objects.create(name='Hair Oils')
+        self.soaps = Category.objects.create(name='Soaps')
+        self.oil_products = make_products(3, category=self.oils)
+        make_products(2, category=self.soaps)
+
+    def test_category_page_lists_only_its_products(self):
+        response = self.client.get(reverse('category', args=[self.oils.category_slug]))
+        self.assertEqual(self.oils.category_slug, 'hair-oils')
+        self.assertEqual([p.pk for p in response.context['product']], [p.pk for p in self.oil_products])
+
+    def test_unknown_category_is_a_404(self):
+        self.assertEqual(self.client.get(reverse('category', args=['nope'])).status_code, 404)
+
+    def test_counts_are_cached_and_invalidated(self):
+        category_counts()
+        with self.assertNumQueries(0):
+            counts = {c['category_slug']: c['product_count'] for c in category_counts()}
+        self.assertEqual(counts, {'hair-oils': 3, 'soaps': 2})
+        make_products(1, category=self.soaps)
+        counts = {c['category_slug']: c['product_count'] for c in category_counts()}
+        self.assertEqual(counts['soaps'], 3)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()  # invalidation runs on commit, which never happens inside a TestCase
+        self.product = make_products(1)[0]
+
+    def test_anonymous_repeat_visit_skips_the_database(self):
+        url = reverse('home')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_discount_invalidates_pages_and_cards(self):
+        url = reverse('home')
+        self.client.get(url)
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(
+                product=self.product, discount_type='fixed', discount_value=Decimal('40'),
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1),
+            )
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Rs 60.00')
+
+    def test_unread_query_parameters_share_the_cached_page(self):
+        home = reverse('home')
+        self.assertEqual(self.client.get(home)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(home, {'utm_source': 'mail', 'x': 'junk'})['X-Page-Cache'], 'hit')
+        self.assertEqual(self.client.get(home, {'searchbox': 'oil'})['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(home, {'searchbox': 'oil', 'junk': '1'})['X-Page-Cache'], 'hit')
+
+    def test_unknown_slugs_leave_nothing_in_the_cache(self):
+        for i in range(3):
+            self.assertEqual(self.client.get(reverse('product_detail', args=[f'made-up-{i}'])).status_code, 404)
+        self.assertEqual([key for key in cache._cache if 'made-up' in key], [])
+
+    def test_stock_change_refreshes_detail_page_only(self):
+        home, detail = reverse('home'), reverse('product_detail', args=[self.product.product_slug])
+        self.client.get(home)
+        self.client.get(detail)
+        buyer = User.objects.create_user('buyer')
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(buyer, self.product, 1, phoneno1='1', address='A')
+        self.assertEqual(self.client.get(home)['X-Page-Cache'], 'hit')
+        self.assertEqual(self.client.get(detail)['X-Page-Cache'], 'miss')
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.force_login(User.objects.create_user('shopper'))
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('home')).get('X-Page-Cache'), None)
+
+
+class ProductDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_products(1)[0]
+        ProductImage.objects.create(product=self.product, image_url='https://example.com/a.jpg')
+        ProductImage.objects.create(product=self.product, image_url='https://example.com/b.jpg')
+        self.url = reverse('product_detail', args=[self.product.product_slug])
+        self.client.force_login(User.objects.create_user('shopper'))  # skip the page cache
+
+    def test_bundle_loads_in_two_queries_then_none(self):
+        caching.product_version(self.product.product_slug)  # seeded on commit outside a TestCase
+        with self.assertNumQueries(2):
+            product_bundle(self.product.product_slug)
+        with self.assertNumQueries(0):
+            product = product_bundle(self.product.product_slug)
+            self.assertEqual(len(product.images.all()), 2)
+            self.assertEqual(product.category.name, self.product.category.name)
+
+    def test_bundle_expires_by_the_next_price_change(self):
+        with mock.patch('project.catalog.cache.set') as cache_set:
+            product_bundle(self.product.product_slug)
+        self.assertEqual(cache_set.call_args.args[2], settings.PAGE_CACHE_SECONDS)
+
+        Product.objects.filter(pk=self.product.pk).update(price_expires_at=timezone.now() + timedelta(seconds=90))
+        caching.invalidate_products([self.product], listings=False)
+        with mock.patch('project.catalog.cache.set') as cache_set:
+            product_bundle(self.product.product_slug)
+        self.assertLessEqual(cache_set.call_args.args[2], 90)
+
+    def test_unknown_slug_is_404(self):
+        self.assertEqual(self.client.get(reverse('product_detail', args=['no-such-thing'])).status_code, 404)
+
+    def test_conditional_get_returns_304(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'alt="Image 2"')
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(2):  # session and user only
+            again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_edit_changes_etag_and_content(self):
+        etag = self.client.get(self.url)['ETag']
+        self.product.product_name = 'Renamed rose'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Renamed rose')
+
+
+class CacheCommitTests(TransactionTestCase):
+    """Invalidation waits for commit, so these need real transactions."""
+
+    def setUp(self):
+        cache.clear()
+        self.product = make_products(1)[0]
+
+    def test_request_during_an_uncommitted_edit_does_not_cache_the_old_row(self):
+        home = reverse('home')
+        self.assertContains(self.client.get(home), 'Rs 100.00')
+        saved, release = threading.Event(), threading.Event()
+
+        def edit():
+            try:
+                with transaction.atomic():
+                    product = Product.objects.get(pk=self.product.pk)
+                    product.product_price = Decimal('999')
+                    product.save()
+                    saved.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(edit)
+            saved.wait(10)
+            self.assertContains(self.client.get(home), 'Rs 100.00')  # not committed yet
+            release.set()
+        self.assertEqual(Product.objects.get().effective_price, Decimal('999.00'))
+        response = self.client.get(home)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Rs 999.00')
+
+    def test_discount_window_opening_reprices_cached_pages(self):
+        # Windows open and close without a signal; only the due-price refresh notices
+        now = timezone.now()
+        discount = Discount.objects.create(
+            product=self.product, discount_type='fixed', discount_value=Decimal('40'),
+            start_date=now + timedelta(hours=1), end_date=now + timedelta(hours=2),
+        )
+        home, detail = reverse('home'), reverse('product_detail', args=[self.product.product_slug])
+        self.assertNotContains(self.client.get(home), 'Rs 60.00')
+        self.assertNotContains(self.client.get(detail), 'Rs. 60.00')
+        Discount.objects.filter(pk=discount.pk).update(start_date=now - timedelta(hours=1))
+        Product.objects.filter(pk=self.product.pk).update(price_expires_at=now - timedelta(seconds=1))
+
+        with mock.patch.object(pricing, '_last_refresh', 0.0):
+            response = self.client.get(home)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Rs 60.00')
+        self.assertContains(self.client.get(detail), 'Rs. 60.00')
+
+    def test_revalidation_notices_a_discount_window_opening(self):
+        now = timezone.now()
+        discount = Discount.objects.create(
+            product=self.product, discount_type='fixed', discount_value=Decimal('40'),
+            start_date=now + timedelta(hours=1), end_date=now + timedelta(hours=2),
+        )
+        url = reverse('product_detail', args=[self.product.product_slug])
+        self.client.force_login(User.objects.create_user('shopper'))  # skip the page cache
+        etag = self.client.get(url)['ETag']
+        Discount.objects.filter(pk=discount.pk).update(start_date=now - timedelta(hours=1))
+        Product.objects.filter(pk=self.product.pk).update(price_expires_at=now - timedelta(seconds=1))
+        with mock.patch.object(pricing, '_last_refresh', 0.0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Rs. 60.00')
+
+
+
+def make_jpeg(width, height):
+    out = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(out, 'JPEG')
+    out.seek(0)
+    return out
+
+
+class ResponsiveImageTests(TestCase):
+    CLOUDINARY = 'https://res.cloudinary.com/demo/image/upload/v1700000000/roses/red.jpg'
+    EXTERNAL = 'https://example.com/tulip.jpg'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(THUMBNAIL_ROOT=Path(tmp.name))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_cloudinary_urls_get_transformations(self):
+        self.assertEqual(
+            images.sized_url(self.CLOUDINARY, 320),
+            'https://res.cloudinary.com/demo/image/upload/w_320,c_limit,f_auto,q_auto/v1700000000/roses/red.jpg',
+        )
+        attrs = images.img_attrs(self.CLOUDINARY, 'card')
+        self.assertIn('w_160,c_limit,f_auto,q_auto/v1700000000/roses/red.jpg 160w', attrs)
+        self.assertIn('sizes="(max-width: 767px) 50vw, 33vw"', attrs)
+
+    def test_cards_render_srcset(self):
+        product = make_products(1)[0]
+        ProductImage.objects.create(product=product, image_url=self.CLOUDINARY)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'w_480,c_limit,f_auto,q_auto/v1700000000/roses/red.jpg 480w')
+        self.assertNotContains(response, f'src="{self.CLOUDINARY}"')
+
+    def test_make_thumbnail_shrinks_to_width(self):
+        with Image.open(BytesIO(images.make_thumbnail(make_jpeg(2000, 1000), 320))) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (320, 160)))
+        with Image.open(BytesIO(images.make_thumbnail(make_jpeg(100, 50), 320))) as thumb:
+            self.assertEqual(thumb.size, (100, 50))  # never upscaled
+
+    def test_external_thumbnails_are_generated_once(self):
+        url = images.sized_url(self.EXTERNAL, 240)
+        with mock.patch.object(images, 'fetch', side_effect=lambda _: make_jpeg(1200, 1200)) as fetch:
+            first = self.client.get(url)
+            second = self.client.get(url)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(first['Content-Type'], 'image/webp')
+        self.assertIn('immutable', first['Cache-Control'])
+        with Image.open(BytesIO(b''.join(second.streaming_content))) as thumb:
+            self.assertEqual(thumb.size, (240, 240))
+
+    def test_thumbnail_rejects_forged_tokens_and_odd_widths(self):
+        token = images.sized_url(self.EXTERNAL, 240).rstrip('/').rsplit('/', 1)[1]
+        self.assertEqual(self.client.get(reverse('thumbnail', args=[240, token + 'x'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('thumbnail', args=[241, token])).status_code, 404)
+
+    def test_unreachable_source_falls_back_to_original(self):
+        with mock.patch.object(images, 'fetch', side_effect=OSError):
+            response = self.client.get(images.sized_url(self.EXTERNAL, 240))
+        self.assertRedirects(response, self.EXTERNAL, fetch_redirect_response=False)
+
+
+def fail_job():
+    raise RuntimeError('boom')
+
+
+def outlive_stale_after():
+    Job.objects.filter(status=Job.RUNNING).update(locked_at=timezone.now() - jobs.STALE_AFTER * 2)
+    jobs.heartbeat()
+    return jobs.release_stale()
+
+
+class ImageJobTests(TestCase):
+    SOURCE = 'https://example.com/peony.jpg'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(THUMBNAIL_ROOT=Path(tmp.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.product = make_products(1)[0]
+
+    def add_image(self, url=SOURCE):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(product=self.product, image_url=url)
+
+    def test_saving_an_image_queues_one_job(self):
+        image = self.add_image()
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.payload), ('project.images.process_product_image', {'image_id': image.pk}))
+
+    def test_worker_records_size_placeholder_and_derivatives(self):
+        image = self.add_image()
+        with mock.patch.object(images, 'fetch', side_effect=lambda _: make_jpeg(1600, 1200)):
+            self.assertEqual(jobs.work(), (1, 0))
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (1600, 1200))
+        self.assertTrue(image.placeholder.startswith('data:image/webp;base64,'))
+        self.assertLess(len(image.placeholder), 1000)
+        for width in images.WIDTHS:
+            self.assertTrue(images.thumbnail_path(self.SOURCE, width, 'avif').exists())
+
+        with mock.patch.object(images, 'fetch') as fetch:
+            response = self.client.get(images.sized_url(self.SOURCE, 320), HTTP_ACCEPT='image/avif,image/webp')
+        fetch.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'image/avif')
+        self.assertIn('Accept', response['Vary'])
+
+    def test_cards_reserve_the_measured_size(self):
+        self.add_image()
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'width="1600"')
+        with mock.patch.object(images, 'fetch', side_effect=lambda _: make_jpeg(1600, 1200)):
+            jobs.work()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.primary_image_width, self.product.primary_image_height), (1600, 1200))
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'width="1600" height="1200"')
+        self.assertContains(response, f"background: url('{self.product.primary_image_placeholder}')")
+
+    def test_missing_avif_support_still_processes_the_image(self):
+        image = self.add_image()
+        with mock.patch('PIL.features.check', return_value=False), \
+                mock.patch.object(images, 'fetch', side_effect=lambda _: make_jpeg(800, 600)):
+            self.assertEqual(jobs.work(), (1, 0))
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (800, 600))
+        self.assertTrue(image.placeholder)
+        self.assertTrue(images.thumbnail_path(self.SOURCE, 320, 'webp').exists())
+        self.assertFalse(images.thumbnail_path(self.SOURCE, 320, 'avif').exists())
+        response = self.client.get(images.sized_url(self.SOURCE, 320), HTTP_ACCEPT='image/avif,image/webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+    def test_cloudinary_images_only_get_measured(self):
+        self.add_image('https://res.cloudinary.com/demo/image/upload/v1/peony.jpg')
+        with mock.patch.object(images, 'fetch', side_effect=lambda _: make_jpeg(800, 600)):
+            jobs.work()
+        self.assertEqual(ProductImage.objects.get().width, 800)
+        self.assertFalse(any(settings.THUMBNAIL_ROOT.iterdir()))
+
+    def test_failures_back_off_then_give_up(self):
+        job = Job.objects.create(task='project.tests.fail_job')
+        self.assertEqual(jobs.work(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(jobs.work(), (0, 0))  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(attempts=jobs.MAX_ATTEMPTS - 1, run_after=timezone.now())
+        jobs.work()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_heartbeat_keeps_a_long_job_claimed(self):
+        Job.objects.create(task='project.tests.outlive_stale_after')
+        self.assertEqual(jobs.work(), (1, 0))
+        self.assertEqual(Job.objects.get().result, '0')  # nothing released while it was running
+
+    def test_claims_never_overlap(self):
+        Job.objects.bulk_create([Job(task='project.tests.fail_job') for _ in range(5)])
+        first, second = jobs.claim(3), jobs.claim(3)
+        self.assertEqual(len(first) + len(second), 5)
+        self.assertFalse({job.pk for job in first} & {job.pk for job in second})
+
+
+class PageWeightTests(TestCase):
+    def home_bytes(self, count):
+        Product.objects.all().delete()
+        for product in make_products(count):
+            ProductImage.objects.create(product=product, image_url=f'https://example.com/{product.pk}.jpg')
+        return len(self.client.get(reverse('home')).content)
+
+    def test_cards_add_markup_not_styles(self):
+        one, many = self.home_bytes(1), self.home_bytes(24)
+        per_card = (many - one) / 23
+        # A card is its markup and srcset; the CSS lives in product_card.css, fetched once
+        self.assertLess(per_card, 2500)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'css/product_card', count=1)
+        self.assertContains(response, '<style>', count=1)
+
+
+class StartupTests(TestCase):
+    def test_parse_importtime_counts_top_level_imports_once(self):
+        total, modules = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |   json.decoder\n"
+            "import time:       400 |        500 | json\n"
+            "import time:      1000 |       1000 | flora\n"
+        )
+        self.assertEqual(total, 1.5)
+        self.assertEqual(modules['json.decoder'], 100)
+
+    def test_storefront_cold_start_skips_admin_only_packages(self):
+        out = StringIO()
+        call_command('bench_startup', runs=1, budget_ms=60000, stdout=out)
+        self.assertIn('Within the', out.getvalue())
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_sqlite_connections_are_tuned(self):
+        self.assertEqual(connection.settings_dict['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+
+class CacheSettingsTests(TestCase):
+    def test_per_process_cache_is_refused_outside_debug(self):
+        locmem = {'default': {'BACKEND': 'project.instrumentation.LocMemCache'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['project.E001'])
+        with override_settings(DEBUG=True, CACHES=locmem):
+            self.assertEqual(checks.check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES={'default': {'BACKEND': 'project.instrumentation.FileBasedCache'}}):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class StaticFilesCheckTests(TestCase):
+    def test_card_stylesheet_must_be_collected(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with override_settings(STATIC_ROOT=Path(tmp.name)):
+            self.assertEqual([error.id for error in checks.check_collected_static(None)], ['project.E002'])
+            call_command('collectstatic', interactive=False, verbosity=0)
+            self.assertEqual(checks.check_collected_static(None), [])
+            self.assertTrue((Path(tmp.name) / 'css' / 'product_card.css').exists())
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "plans are read from SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTests(TestCase):
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, f'USING (COVERING )?INDEX {index}')
+        self.assertNotIn('TEMP B-TREE', plan)  # no sort step either
+
+    def test_hot_queries_use_their_indexes(self):
+        user, product = User.objects.create_user('planner'), make_products(1)[0]
+        now = timezone.now()
+        # SQLite builds the unique constraint as an automatic index on both columns
+        self.assertUsesIndex(
+            Cart.objects.filter(user=user, product=product), r'\w+ \(user_id=\? AND product_id=\?\)',
+        )
+        self.assertUsesIndex(Order.objects.filter(user=user).order_by('-order_date'), 'order_user_date_idx')
+        self.assertUsesIndex(Order.objects.filter(status='Pending').order_by('-order_date'), 'order_status_date_idx')
+        self.assertUsesIndex(
+            Discount.objects.filter(product=product, start_date__lte=now, end_date__gt=now),
+            'discount_product_window_idx',
+        )
+        self.assertUsesIndex(
+            Product.objects.filter(category=product.category, hot_sale=True), 'product_category_hot_idx',
+        )
+
+    def test_cart_rows_are_unique_per_product(self):
+        user, product = User.objects.create_user('twice'), make_products(1)[0]
+        Cart.objects.create(user=user, product=product)
+        with self.assertRaises(IntegrityError):
+            Cart.objects.create(user=user, product=product)
+
+
+class CartApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('shopper')
+        self.client.force_login(self.user)
+        self.rose, self.lily, self.tulip = make_products(3)
+        self.url = reverse('cart_api')
+
+    def send(self, method, body):
+        return getattr(self.client, method)(self.url, json.dumps(body), content_type='application/json')
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product__product_slug', 'quantity'))
+
+    def test_adding_twice_increments_one_line(self):
+        self.send('post', {'product_slug': self.rose.product_slug})
+        response = self.send('post', {'product_slug': self.rose.product_slug, 'quantity': 2})
+        self.assertEqual(self.quantities(), {self.rose.product_slug: 3})
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(response.json()['total'], '300.00')
+
+    def test_patch_sets_and_delete_removes(self):
+        self.send('post', {'product_slug': self.rose.product_slug})
+        self.send('patch', {'product_slug': self.rose.product_slug, 'quantity': 5})
+        self.assertEqual(self.quantities(), {self.rose.product_slug: 5})
+        response = self.send('delete', {'product_slug': self.rose.product_slug})
+        self.assertEqual(response.json()['lines'], [])
+
+    def test_batched_changes_apply_together(self):
+        self.send('post', {'product_slug': self.tulip.product_slug})
+        response = self.send('post', {'lines': [
+            {'product_slug': self.rose.product_slug, 'quantity': 2},
+            {'product_slug': self.lily.product_slug, 'op': 'set', 'quantity': 4},
+            {'product_slug': self.tulip.product_slug, 'op': 'remove'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {self.rose.product_slug: 2, self.lily.product_slug: 4})
+
+    def test_a_bad_line_rejects_the_whole_batch(self):
+        response = self.send('post', {'lines': [
+            {'product_slug': self.rose.product_slug},
+            {'product_slug': 'no-such-product'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+        self.assertEqual(self.send('post', {'product_slug': self.rose.product_slug, 'quantity': -1}).status_code, 400)
+
+    def test_repeated_adds_stop_at_the_maximum(self):
+        for _ in range(3):
+            self.assertEqual(self.send('post', {'product_slug': self.rose.product_slug, 'quantity': 400}).status_code, 200)
+        self.assertEqual(self.quantities(), {self.rose.product_slug: cart_service.MAX_QUANTITY})
+
+    def test_non_string_slugs_are_rejected(self):
+        for slug in (['rose'], {'slug': 'rose'}, None, 3):
+            response = self.send('post', {'lines': [{'product_slug': self.rose.product_slug}, {'product_slug': slug}]})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Invalid product', response.json()['error'])
+        self.client.logout()
+        self.assertEqual(self.send('post', {'product_slug': ['rose']}).status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+    def test_get_no_longer_mutates(self):
+        response = self.client.get(reverse('cart_add'), {'product_slug': self.rose.product_slug})
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.quantities(), {})
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    def test_racing_adds_all_count(self):
+        user, product = User.objects.create_user('clicker'), make_products(1)[0]
+
+        def click(_):
+            try:
+                for _ in range(10):
+                    while True:
+                        try:
+                            cart_service.add(user, product.pk)
+                            break
+                        except OperationalError:  # SQLite write contention
+                            continue
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(click, range(8)))
+        self.assertEqual(list(Cart.objects.values_list('quantity', flat=True)), [80])
+
+
+class CheckoutConcurrencyTests(TransactionTestCase):
+    def test_quantity_change_during_checkout_is_not_lost(self):
+        user, product = User.objects.create_user('bumper'), make_products(1)[0]
+        Cart.objects.create(user=user, product=product, quantity=1)
+        reserving, bumped = threading.Event(), threading.Event()
+        reserve_stock = checkout.reserve_stock
+
+        def slow_reserve(quantities):
+            reserving.set()
+            bumped.wait(0.5)  # the bump gets its chance while checkout holds the cart
+            return reserve_stock(quantities)
+
+        def bump():
+            reserving.wait(5)
+            try:
+                cart_service.add(user, product.pk)
+            finally:
+                bumped.set()
+                connection.close()
+
+        with mock.patch.object(checkout, 'reserve_stock', slow_reserve), ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(bump)
+            order, _ = checkout_cart(user, phoneno1='1', address='A')
+            pending.result()
+        ordered = order.lines.get().quantity
+        left = sum(Cart.objects.filter(user=user).values_list('quantity', flat=True))
+        self.assertEqual(ordered + left, 2)
+
+
+class CookieCartTests(TestCase):
+    def setUp(self):
+        self.rose, self.lily = make_products(2)
+        self.url = reverse('cart_api')
+
+    def add(self, product, quantity=1):
+        body = json.dumps({'product_slug': product.product_slug, 'quantity': quantity})
+        return self.client.post(self.url, body, content_type='application/json')
+
+    def test_anonymous_cart_writes_nothing_to_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.add(self.rose)
+            response = self.add(self.rose, 2)
+            page = self.client.get(reverse('cart'))
+        writes = [q['sql'] for q in queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(page.status_code, 200)
+        self.assertContains(page, self.rose.product_name)
+        self.assertContains(page, 'Log in to check out')
+        self.assertFalse(Cart.objects.exists())
+
+    def test_a_tampered_cookie_is_an_empty_cart(self):
+        self.add(self.rose)
+        self.client.cookies[cart_service.COOKIE_NAME] = '{"%d":500}' % self.rose.pk
+        self.assertEqual(self.client.get(self.url).json()['lines'], [])
+
+    def test_login_merges_the_cookie_cart_in_one_upsert(self):
+        user = User.objects.create_user('shopper', password='pw-12345')
+        Cart.objects.create(user=user, product=self.rose, quantity=1)
+        self.add(self.rose, 2)
+        self.add(self.lily)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), {'username': 'shopper', 'password': 'pw-12345'})
+        self.assertEqual(response.status_code, 302)
+        cart_writes = [q for q in queries if 'INSERT INTO "project_cart"' in q['sql']]
+        self.assertEqual(len(cart_writes), 1)
+        self.assertEqual(
+            dict(Cart.objects.filter(user=user).values_list('product_id', 'quantity')),
+            {self.rose.pk: 3, self.lily.pk: 1},
+        )
+        self.assertEqual(response.cookies[cart_service.COOKIE_NAME].value, '')
+        self.assertEqual(self.client.get(self.url).json()['count'], 4)
+
+    def test_signup_keeps_the_cookie_cart(self):
+        self.add(self.lily, 2)
+        self.client.post(reverse('signup'), {
+            'username': 'newcomer', 'email': 'new@example.com', 'password1': 'pw-12345', 'password2': 'pw-12345',
+        })
+        user = User.objects.get(username='newcomer')
+        self.assertEqual(list(Cart.objects.filter(user=user).values_list('product_id', 'quantity')), [(self.lily.pk, 2)])
+
+
+class AdminChangelistTests(TestCase):
+    ROWS = 10_000
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([User(username=f'customer{i}') for i in range(200)])
+        users = list(User.objects.all())
+        products = make_products(50)
+        start = timezone.now() - timedelta(days=365)
+        Order.objects.bulk_create([
+            Order(
+                user=users[i % len(users)], product=products[i % len(products)], phoneno1='0300', address='Street',
+                order_date=start + timedelta(hours=i), total_price=Decimal('100.00'),
+            )
+            for i in range(cls.ROWS)
+        ], batch_size=1000)
+        Cart.objects.bulk_create([Cart(user=user, product=products[0]) for user in users])
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.client.get(reverse('admin:index'))  # warm the cached navigation categories
+
+    def changelist(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:project_{model}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_order_changelist_query_count_is_pinned(self):
+        # session, user, count, page, permissions x2, date hierarchy x2
+        response, queries = self.changelist('order')
+        self.assertEqual(len(queries), 8)
+        self.assertNotRegex(response.content.decode(), r'<option[^>]*>\s*customer')  # no option per user
+
+        customer = User.objects.get(username='customer7')
+        response, queries = self.changelist('order', user__id__exact=customer.pk, order_date__year=timezone.now().year)
+        self.assertEqual(len(queries), 8)  # the selected user's label instead of the first/last dates
+        self.assertContains(response, 'customer7</option>')
+
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'project', 'model_name': 'order', 'field_name': 'user', 'term': 'customer19',
+        })
+        self.assertIn('customer199', [result['text'] for result in response.json()['results']])
+
+    def test_other_changelists_join_instead_of_querying_per_row(self):
+        for model in ('cart', 'product', 'productimage'):
+            with self.subTest(model=model):
+                _, queries = self.changelist(model)
+                self.assertLess(len(queries), 12)
+
+
+CATALOG_CSV = """product_name,product_price,category,stock,hot_sale,image_urls
+Rose Oil,250.00,Hair Oil,5,yes,https://example.com/rose.jpg|https://example.com/rose-2.jpg
+Amla Shampoo,180,Shampoo,0,no,
+rose oil,260,Hair Oil,7,,
+"""
+
+
+class ProductImportTests(TestCase):
+    def run_import(self, text, fmt='csv', **kwargs):
+        from .importer import import_products
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_products(StringIO(text), fmt, **kwargs)
+
+    def test_csv_import_creates_products_with_their_derived_state(self):
+        report = self.run_import(CATALOG_CSV)
+        self.assertEqual((report.rows, report.created, report.updated, report.images), (3, 3, 0, 2))
+
+        rose = Product.objects.get(product_slug='rose-oil')
+        self.assertEqual((rose.category.name, rose.stock, rose.hot_sale), ('Hair Oil', 5, True))
+        self.assertEqual(rose.effective_price, Decimal('250.00'))
+        self.assertEqual(rose.primary_image_url, 'https://example.com/rose.jpg')
+        # A different name with the same slug gets its own product
+        self.assertEqual(Product.objects.get(product_slug='rose-oil-2').product_name, 'rose oil')
+        self.assertEqual(list(search.filter_queryset(Product.objects.all(), 'amla')), [Product.objects.get(product_slug='amla-shampoo')])
+        job = Job.objects.get()
+        self.assertEqual(job.task, 'project.images.process_product_images')
+        self.assertEqual(len(job.payload['image_ids']), 2)
+
+    def test_explicit_slug_colliding_with_a_generated_one_is_reported(self):
+        report = self.run_import(
+            'product_name,product_price,category,product_slug\n'
+            'Rose Oil,250,Hair Oil,\n'
+            'Lavender Oil,300,Hair Oil,rose-oil\n'
+            'Amla Shampoo,180,Shampoo,amla-shampoo\n'
+            'Amla Shampoo,190,Shampoo,\n'
+        )
+        self.assertEqual((report.rows, report.skipped), (2, 2))
+        self.assertEqual([line for line, _ in report.errors], [3, 5])
+        self.assertIn('Duplicate product_slug', report.errors[0][1])
+        self.assertEqual(Product.objects.get(product_slug='rose-oil').product_name, 'Rose Oil')
+        self.assertEqual(Product.objects.get(product_slug='amla-shampoo').product_price, Decimal('180'))
+
+    def test_reimport_updates_in_place_and_leaves_missing_columns_alone(self):
+        self.run_import(CATALOG_CSV)
+        report = self.run_import(
+            'product_name,product_price,category,image_urls\n'
+            'Rose Oil,300,Hair Oil,https://example.com/new-rose.jpg\n'
+            'Amla Shampoo,180,Shampoo,https://example.com/amla.jpg\n'
+        )
+        self.assertEqual((report.created, report.updated, report.images), (0, 2, 2))
+        rose = Product.objects.get(product_slug='rose-oil')
+        self.assertEqual((rose.product_price, rose.effective_price, rose.stock), (Decimal('300.00'), Decimal('300.00'), 5))
+        self.assertEqual(rose.images.count(), 3)
+        self.assertEqual(rose.primary_image_url, 'https://example.com/rose.jpg')
+        amla = Product.objects.get(product_slug='amla-shampoo')
+        self.assertEqual(amla.primary_image_url, 'https://example.com/amla.jpg')
+
+    def test_queries_do_not_grow_with_rows(self):
+        def queries_for(count):
+            rows = ''.join(f'Product {count}-{i},10,Hair Oil,1,,https://example.com/{count}/{i}.jpg\n' for i in range(count))
+            with CaptureQueriesContext(connection) as queries:
+                self.run_import('product_name,product_price,category,stock,hot_sale,image_urls\n' + rows)
+            return len(queries)
+
+        queries_for(1)  # creates the category
+        # One chunk: a fixed set of statements, with SQLite splitting each INSERT into a few batches
+        self.assertLessEqual(queries_for(300), queries_for(10) + 6)
+
+    def test_jsonl_and_bad_rows(self):
+        report = self.run_import('\n'.join([
+            '{"product_name": "Neem Comb", "product_price": 50, "category": "Tools", "image_urls": ["https://example.com/comb.jpg"]}',
+            '{"product_name": "No Price", "category": "Tools"}',
+            'not json',
+            '{"product_name": "Negative", "product_price": 5, "category": "Tools", "stock": -1}',
+        ]), 'jsonl')
+        self.assertEqual((report.rows, report.skipped), (1, 3))
+        self.assertEqual([line for line, _ in report.errors], [2, 3, 4])
+        self.assertEqual(Product.objects.get().images.get().image_url, 'https://example.com/comb.jpg')
+
+    def test_saving_one_product_still_makes_unique_slugs(self):
+        category = Category.objects.create(name='Hair Oil')
+        first = Product.objects.create(product_name='Rose Oil', product_price=1, category=category)
+        second = Product.objects.create(product_name='Rose Oil', product_price=1, category=category)
+        self.assertNotEqual(first.product_slug, second.product_slug)
+
+    def test_admin_upload_is_imported_by_a_job(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        upload = BytesIO(CATALOG_CSV.encode())
+        upload.name = 'catalog.csv'
+        with override_settings(IMPORT_ROOT=Path(tmp.name)), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:project_product_import'), {'file': upload})
+        self.assertRedirects(response, reverse('admin:project_product_changelist'), fetch_redirect_response=False)
+        self.assertEqual(Product.objects.count(), 0)
+        self.assertContains(self.client.get(reverse('admin:project_product_changelist')), 'Import of catalog.csv queued')
+
+        self.assertEqual(jobs.work(), (1, 0))
+        self.assertEqual(Product.objects.count(), 3)
+        job = Job.objects.get(task='project.importer.import_file')
+        self.assertIn('3 created', job.result)
+        self.assertFalse(any(Path(tmp.name).iterdir()))
+        self.assertContains(self.client.get(reverse('admin:project_job_changelist')), '3 created')
+
+    def test_failed_import_job_deletes_its_upload(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        upload = Path(tmp.name) / 'broken.csv'
+        upload.write_bytes(b'product_name,product_price,category\n\xff\xfe,1,x\n')  # not UTF-8
+        job = Job.objects.create(task='project.importer.import_file', payload={'path': str(upload), 'fmt': 'csv'})
+        self.assertEqual(jobs.work(), (0, 1))
+        self.assertTrue(upload.exists())  # kept for the retry
+        Job.objects.filter(pk=job.pk).update(attempts=jobs.MAX_ATTEMPTS - 1, run_after=timezone.now())
+        self.assertEqual(jobs.work(), (0, 1))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertFalse(upload.exists())
+
+    def test_imports_heartbeat_between_chunks(self):
+        with mock.patch.object(jobs, 'heartbeat') as heartbeat:
+            self.run_import(CATALOG_CSV, chunk_size=1)
+        self.assertEqual(heartbeat.call_count, 3)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as catalog:
+            catalog.write(CATALOG_CSV)
+        out = StringIO()
+        call_command('import_products', catalog.name, stdout=out)
+        Path(catalog.name).unlink()
+        self.assertIn('3 created', out.getvalue())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', email='buyer@example.com')
+        cls.product = make_products(1)[0]
+        now = timezone.now()
+        Order.objects.bulk_create([
+            Order(
+                user=cls.user, product=cls.product, phoneno1='0300', address=f'House {i}',
+                order_date=now - timedelta(days=i), total_price=Decimal('100.00'),
+                status='Shipped' if i % 2 else 'Pending',
+            )
+            for i in range(10)
+        ])
+        Contact.objects.create(name='Ayesha', email='a@example.com', message='Hello, "world"\nBye')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+
+    def download(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_order_export_filters_by_date_and_status(self):
+        today = timezone.localdate()
+        response = self.client.get(reverse('admin:project_order_export'), {
+            'format': 'csv', 'status': 'Shipped',
+            'date_from': today - timedelta(days=5), 'date_to': today - timedelta(days=1),
+        })
+        self.assertIn('attachment; filename="orders-', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(self.download(response))))
+        self.assertEqual([row['address'] for row in rows], ['House 1', 'House 3', 'House 5'])
+        self.assertEqual((rows[0]['customer'], rows[0]['product'], rows[0]['total_price']), ('buyer', 'Product 0', '100.00'))
+
+    def test_csv_cells_never_become_formulas(self):
+        Contact.objects.create(name='=HYPERLINK("http://evil.example","x")', email='e@example.com', message='@SUM(1)')
+        response = self.client.get(reverse('admin:project_contact_export'), {'format': 'csv'})
+        row = list(csv.DictReader(StringIO(self.download(response))))[-1]
+        self.assertEqual((row['name'], row['message']), ('\'=HYPERLINK("http://evil.example","x")', "'@SUM(1)"))
+        jsonl = self.download(self.client.get(reverse('admin:project_contact_export'), {'format': 'jsonl'}))
+        self.assertEqual(json.loads(jsonl.splitlines()[-1])['message'], '@SUM(1)')  # only CSV opens in a spreadsheet
+
+    def test_cart_orders_export_one_row_per_line(self):
+        first, second = make_products(2, category=self.product.category)
+        for product in (first, second):
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        order, _ = checkout_cart(self.user, phoneno1='0300', address='Cart House')
+        response = self.client.post(reverse('admin:project_order_changelist'), {
+            'action': 'export_csv', '_selected_action': [order.pk],
+        })
+        rows = list(csv.DictReader(StringIO(self.download(response))))
+        self.assertEqual(
+            [(row['order_id'], row['product'], row['quantity'], row['unit_price'], row['line_total']) for row in rows],
+            [(str(order.pk), 'Product 0', '2', '100.00', '200.00'), (str(order.pk), 'Product 1', '2', '100.00', '200.00')],
+        )
+        self.assertEqual({row['total_price'] for row in rows}, {'400.00'})
+
+    def test_export_page_and_selected_rows_action(self):
+        self.assertContains(self.client.get(reverse('admin:project_order_export')), 'Download')
+        contact = Contact.objects.get()
+        response = self.client.post(reverse('admin:project_contact_changelist'), {
+            'action': 'export_jsonl', '_selected_action': [contact.pk],
+        })
+        line = json.loads(self.download(response))
+        self.assertEqual(line, {'id': contact.pk, 'name': 'Ayesha', 'email': 'a@example.com', 'message': 'Hello, "world"\nBye'})
+
+    def test_export_memory_stays_flat_as_rows_grow(self):
+        # Real rows through export_response and the values_list iterator, as bench_export measures them
+        now = timezone.now()
+        orders = Order.objects.bulk_create([
+            Order(user=self.user, product=self.product, phoneno1='0300', address=f'Bulk house {i}',
+                  order_date=now, total_price=Decimal('100.00'))
+            for i in range(20_000)
+        ], batch_size=2000)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=self.product, unit_price=Decimal('100.00'), line_total=Decimal('100.00'))
+            for order in orders
+        ], batch_size=2000)
+        bulk = Order.objects.filter(address__startswith='Bulk')
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt):
+                peaks = {}
+                for count, queryset in ((2_000, bulk.filter(pk__lte=orders[1999].pk)), (20_000, bulk)):
+                    response = exporter.export_response(queryset, exporter.ORDER_COLUMNS, fmt, 'orders', exporter.ORDER_ORDERING)
+                    _, lines, peaks[count] = drain(response)
+                    self.assertEqual(lines, count + (fmt == 'csv'))
+                # Ten times the rows, about the same memory: one chunk is held at a time, never the result set
+                self.assertLess(peaks[20_000], peaks[2_000] * 2)
+
+
+@override_settings(SERVER_TIMING=True)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Oils')
+        for i in range(12):
+            Product.objects.create(product_name=f'Oil {i}', product_price=100, category=category)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('home'))
+        timing = response['Server-Timing']
+        for part in ('app;dur=', 'db;dur=', 'tpl;dur=', 'cache;desc='):
+            self.assertIn(part, timing)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_can_be_turned_off(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+
+    def test_one_structured_line_per_request(self):
+        with self.assertLogs('project.requests', 'INFO') as logs:
+            self.client.get(reverse('home'))
+        record, = logs.records
+        self.assertEqual(record.levelno, logging.INFO)
+        self.assertEqual(record.data['view'], 'home')
+        self.assertEqual(record.data['status'], 200)
+        self.assertGreater(record.data['queries'], 0)
+        for key in ('ms', 'db_ms', 'template_ms', 'cache_hits', 'cache_misses'):
+            self.assertIn(key, record.data)
+        self.assertNotIn('n_plus_one', record.data)
+
+    def test_repeated_query_shape_is_flagged(self):
+        def per_row_view(request):
+            names = [Product.objects.get(pk=pk).product_name for pk in Product.objects.values_list('pk', flat=True)]
+            return HttpResponse(', '.join(names))
+
+        middleware = instrumentation.RequestMetricsMiddleware(per_row_view)
+        with self.assertLogs('project.requests', 'WARNING') as logs:
+            middleware(RequestFactory().get('/n-plus-one/'))
+        repeated, = logs.records[0].data['n_plus_one']
+        self.assertEqual(repeated['count'], 12)
+        self.assertIn('"project_product"', repeated['sql'])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_listed(self):
+        with self.assertLogs('project.requests', 'WARNING') as logs:
+            self.client.get(reverse('home'))
+        self.assertTrue(logs.records[0].data['slow_queries'])
+
+    def test_cache_hits_and_misses_are_counted(self):
+        def cached_view(request):
+            cache.get('instrumentation-test')
+            cache.set('instrumentation-test', 1)
+            cache.get('instrumentation-test')
+            return HttpResponse()
+
+        response = instrumentation.RequestMetricsMiddleware(cached_view)(RequestFactory().get('/'))
+        self.assertIn('cache;desc="1 hits, 1 misses"', response['Server-Timing'])
+
+    def test_json_formatter(self):
+        record = logging.makeLogRecord({
+            'name': 'project.requests', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': 'GET %s', 'args': ('/',), 'data': {'queries': 3},
+        })
+        entry = json.loads(instrumentation.JsonFormatter().format(record))
+        self.assertEqual(entry['message'], 'GET /')
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['queries'], 3)
+
+
+class BenchmarkTests(TestCase):
+    def test_generator_is_sized_and_seeded(self):
+        scale = benchmarks.SCALES['tiny']
+        benchmarks.generate(scale, seed=7)
+        self.assertEqual(Product.objects.count(), scale['products'])
+        self.assertEqual(ProductImage.objects.count(), scale['products'] * scale['images_per_product'])
+        self.assertEqual(User.objects.count(), scale['users'])
+        self.assertEqual(Cart.objects.count(), scale['users'] * scale['cart_lines'])
+        self.assertEqual(Order.objects.count(), scale['orders'])
+        self.assertEqual(Analytics.objects.get().total_orders, scale['orders'])
+        self.assertFalse(Order.objects.filter(lines__isnull=True).exists())
+        self.assertFalse(Order.objects.annotate(lines_total=Sum('lines__line_total'))
+                         .exclude(total_price=F('lines_total')).exists())
+        self.assertEqual(
+            sum(ProductSales.objects.values_list('units_sold', flat=True)),
+            OrderLine.objects.aggregate(units=Sum('quantity'))['units'],
+        )
+        discounted = Product.objects.filter(discounts__isnull=False).first()
+        self.assertLess(discounted.effective_price, discounted.product_price)
+        self.assertIn(discounted.pk, search.ranked_ids(discounted.product_name))
+        generated = list(Product.objects.order_by('pk').values_list('product_name', 'product_price', 'stock'))
+
+        with self.assertRaises(ValueError):
+            benchmarks.generate(scale, seed=7)
+        Product.objects.all().delete()
+        User.objects.all().delete()
+        benchmarks.generate(scale, seed=7)
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('product_name', 'product_price', 'stock')), generated)
+
+    def test_client_run_covers_every_scenario(self):
+        benchmarks.generate(benchmarks.SCALES['tiny'])
+        results = benchmarks.run_client(requests=3, warmup=2)
+        self.assertEqual(list(results), [scenario.name for scenario in benchmarks.SCENARIOS])
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual((result['requests'], result['errors']), (3, 0))
+                self.assertIsNotNone(result['queries'])
+        self.assertEqual(Order.objects.filter(user__username='bench-shopper').count(), 5)
+
+    def test_queries_per_request_do_not_grow_with_the_data(self):
+        benchmarks.generate(benchmarks.SCALES['tiny'], seed=1)
+        smaller = benchmarks.run_client(requests=3, warmup=2)
+        benchmarks.generate({**benchmarks.SCALES['tiny'], 'products': 600, 'users': 50, 'orders': 1000}, seed=2)
+        larger = benchmarks.run_client(requests=3, warmup=2)
+        self.assertEqual(
+            {name: result['queries'] for name, result in larger.items()},
+            {name: result['queries'] for name, result in smaller.items()},
+        )
+
+    def test_compare_against_thresholds(self):
+        baseline = {'home': {'requests': 10, 'errors': 0, 'rps': 100.0, 'p50_ms': 8.0, 'p95_ms': 10.0, 'queries': 3}}
+        same = dict(baseline['home'], p95_ms=19.0, rps=70.0)  # within 1.5x + 5ms and -33%
+        self.assertEqual(benchmarks.compare({'home': same}, baseline), [])
+        regressions = benchmarks.compare({'home': dict(same, queries=4, p95_ms=21.0, rps=60.0, errors=1)}, baseline)
+        self.assertEqual(len(regressions), 4)
+        self.assertEqual(benchmarks.compare({'home': dict(same, queries=4)}, baseline, {'query_slack': 1}), [])
+        self.assertEqual(benchmarks.compare({'cart': same}, baseline), [])
+
+    def test_baseline_is_saved_and_checked(self):
+        benchmarks.generate(benchmarks.SCALES['tiny'])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'baseline.json'
+            options = {'scenarios': ['home', 'cart'], 'requests': 3, 'baseline': str(path), 'stdout': StringIO()}
+            call_command('bench_endpoints', update_baseline=True, **options)
+            saved = json.loads(path.read_text())
+            self.assertEqual(set(saved['client']), {'home', 'cart'})
+            self.assertEqual(saved['thresholds'], benchmarks.THRESHOLDS)
+            # Three requests time too noisily to hold to the real thresholds; queries stay exact
+            saved['thresholds'].update(latency_tolerance=100, throughput_tolerance=1)
+            path.write_text(json.dumps(saved))
+
+            out = StringIO()
+            call_command('bench_endpoints', **{**options, 'stdout': out})
+            self.assertIn("Within the baseline's thresholds.", out.getvalue())
+
+            saved['client']['home']['queries'] -= 1
+            path.write_text(json.dumps(saved))
+            with self.assertRaisesMessage(CommandError, 'home: '):
+                call_command('bench_endpoints', **options)
@@ -0,0 +1,45 @@
+"""
+Voucher redemption.
+
+``claim`` checks the limit and takes a use in one conditional UPDATE
+(``times_used < usage_limit``), so concurrent checkouts can never redeem a
+voucher more often than allowed and no lock outlives that single statement.
+``record`` writes the VoucherRedemption ledger row. Both belong inside the
+checkout transaction, so a failed order gives the use back and the ledger
+always agrees with ``Voucher.times_used``.
+"""
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Voucher, VoucherRedemption
+from .pricing import apply_discount
+
+
+class VoucherError(Exception):
+    pass
+
+
+def claim(code):
+    # Codes are typed in any case but stored case-sensitively, so "SAVE10" and "save10" can
+    # both exist; settle on one voucher (an exact match first) before touching any of them
+    pk = (
+        Voucher.objects.filter(code__iexact=code)
+        .order_by(Case(When(code=code, then=Value(0)), default=Value(1), output_field=IntegerField()), 'pk')
+        .values_list('pk', flat=True).first()
+    )
+    at = timezone.now()
+    claimed = pk is not None and Voucher.objects.filter(
+        pk=pk, valid_from__lte=at, valid_to__gte=at, times_used__lt=F('usage_limit'),
+    ).update(times_used=F('times_used') + 1)
+    if not claimed:
+        raise VoucherError("This voucher is invalid, expired or fully redeemed.")
+    return Voucher.objects.get(pk=pk)
+
+
+def record(voucher, user, order=None):
+    return VoucherRedemption.objects.create(voucher=voucher, user=user, order=order)
+
+
+def discount_for(voucher, subtotal):
+    """Amount taken off ``subtotal`` by ``voucher``, never more than the subtotal itself."""
+    return subtotal - apply_discount(subtotal, voucher.discount_type, voucher.discount_value)